@@ -218,6 +218,55 @@ def file_hash_test(numbe_of_iterations=1):
         print('There was', numbe_of_iterations / resultTime, 'inputs per second')
 
 
+def nested_tokens_test(numbe_of_iterations=100, depths=(10, 100, 1000)):
+    # Nested Not_PreBool chains: "81 81 ... 27 16 ... 16 16 53"
+    from unreal_script_byte_code_compiller_decompiller import full_decompile, full_compile
+    for depth in depths:
+        input_bytes = b'\x81' * depth + b'\x27' + b'\x16' * depth + b'\x53'
+        decompiled_text = full_decompile(input_bytes)[2]
+
+        startTime = time.time()
+        index = numbe_of_iterations
+        while index > 0:
+            full_decompile(input_bytes)
+            index -= 1
+        endTime = time.time()
+        resultTime = endTime - startTime
+        print('Depth', depth, 'decompile: it was used', resultTime, 'seconds to make', numbe_of_iterations,
+              'convertions')
+        if resultTime > 0:
+            print('There was', numbe_of_iterations / resultTime, 'inputs per second')
+
+        startTime = time.time()
+        index = numbe_of_iterations
+        while index > 0:
+            full_compile(decompiled_text)
+            index -= 1
+        endTime = time.time()
+        resultTime = endTime - startTime
+        print('Depth', depth, 'compile: it was used', resultTime, 'seconds to make', numbe_of_iterations,
+              'convertions')
+        if resultTime > 0:
+            print('There was', numbe_of_iterations / resultTime, 'inputs per second')
+
+
+def names_tables_dump_test(numbe_of_iterations=5):
+    from unreal_script_byte_code_compiller_decompiller import get_names_table_and_import_table
+    file_name = r"C:\Development\XCOM Modding\Work\CookedPCConsole_Deserialized\XComGame.txt"
+    startTime = time.time()
+    index = numbe_of_iterations
+    while index > 0:
+        header, tables = get_names_table_and_import_table(file_name)
+        index -= 1
+    endTime = time.time()
+    resultTime = endTime - startTime
+    number_of_entries = sum(len(table) for table in tables)
+    print('It was used', resultTime, 'seconds to parse', numbe_of_iterations, 'dumps of', number_of_entries,
+          'entries')
+    if resultTime > 0:
+        print('There was', numbe_of_iterations * number_of_entries / resultTime, 'entries per second')
+
+
 def run_single_test():
     # hex_to_bytes_test()
     # dir_hash_test()
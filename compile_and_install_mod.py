@@ -17,6 +17,7 @@
 from unreal_script_byte_code_compiller_decompiller import run_compile_and_reformat_source_code_with_debug_out, \
     compile_and_reformat_source_code
 from patch_upk import main as patch_upk_main
+from ucb_tools_files_cache_manager import get_compiled_functions_cache
 from help_tools import filtered_file_list, FilteringType
 import os.path
 import shutil
@@ -65,7 +66,8 @@ def install_files_to_steam_folder():
 
 def main():
     print('COMPILATION...')
-    run_compile_and_reformat_source_code_with_debug_out(compile_and_reformat_source_code)
+    run_compile_and_reformat_source_code_with_debug_out(
+            lambda: compile_and_reformat_source_code(get_compiled_functions_cache()))
     print('COMPILATION IS DONE.')
     print()
     print()
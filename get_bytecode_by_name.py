@@ -46,6 +46,31 @@ XCOM_DESERIALIZED_UPK_DIR = r'C:\Development\XCOM Modding\Work\CookedPCConsole_D
 UPK_UTILS_DIR = r'C:\Tools\UPKUtils'
 SEARCH_NAME = 'XComGame.XGAbility_Targeted.RollForHit'
 OUTPUT_FOLDER = r'C:\Development\XCOM Modding'
+FUNCTION_HEADER_SIZE = 48
+FUNCTION_FOOTER_SIZE = 15
+
+
+def get_export_serial_info(deserialized_object_data):
+    '''
+    :param deserialized_object_data: text of the deserialized object's .txt file
+    :return: (serial_offset, serial_size)
+    '''
+    serial_offset_hex = get_text_in_brackets(deserialized_object_data, 'SerialOffset:', '\n').strip()[2:]
+    serial_size_hex = get_text_in_brackets(deserialized_object_data, 'SerialSize:', '(').strip()[2:]
+
+    serial_offset = hex_dword_to_int(serial_offset_hex)
+    serial_size = hex_dword_to_int(serial_size_hex)
+    return serial_offset, serial_size
+
+
+def get_function_bytecode(full_function_data):
+    '''
+    :param full_function_data: serialized data of the function export
+    :return: (function_byte_code, is_ok); is_ok is False when EndOfScript wasn't found at the end of the bytecode
+    '''
+    function_byte_code = full_function_data[FUNCTION_HEADER_SIZE:-FUNCTION_FOOTER_SIZE]
+    is_ok = function_byte_code[-1:] == b'\x53'
+    return function_byte_code, is_ok
 
 
 def main():
@@ -63,14 +88,10 @@ def main():
     with open(name, 'r') as file:
         data = file.read()
 
-    serial_offset_hex = get_text_in_brackets(data, 'SerialOffset:', '\n').strip()[2:]
-    serial_size_hex = get_text_in_brackets(data, 'SerialSize:', '(').strip()[2:]
+    serial_offset, serial_size = get_export_serial_info(data)
 
-    serial_offset = hex_dword_to_int(serial_offset_hex)
-    serial_size = hex_dword_to_int(serial_size_hex)
-
-    print('Offset: 0x{} ({})'.format(serial_offset_hex, serial_offset))
-    print('Full Size: 0x{} ({})'.format(serial_size_hex, serial_size))
+    print('Offset: 0x{:08X} ({})'.format(serial_offset, serial_offset))
+    print('Full Size: 0x{:08X} ({})'.format(serial_size, serial_size))
 
     name = copy.deepcopy(name_bak)
     name = os.path.join(XCOM_UNPACKED_UPK_DIR, name[0])
@@ -84,11 +105,8 @@ def main():
 
     full_function_data = get_slice_from_array(data, serial_offset, serial_size)
     # full_function_data = data[serial_offset: serial_offset + serial_size]
-    function_byte_code = full_function_data[48:-15]
-
-    error_in_bytecode = False
-    if function_byte_code[-1:] != b'\x53':
-        error_in_bytecode = True
+    function_byte_code, is_function_byte_code_ok = get_function_bytecode(full_function_data)
+    error_in_bytecode = not is_function_byte_code_ok
 
     full_function_data = bytes__to__hex_string(full_function_data).encode()
     function_byte_code = bytes__to__hex_string(function_byte_code).encode()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+# Copyright © 2016 ButenkoMS. All rights reserved. Contacts: <gtalk@butenkoms.space>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os.path
+import time
+import json
+from concurrent.futures import ProcessPoolExecutor
+from get_bytecode_by_name import get_export_serial_info, get_function_bytecode, FUNCTION_HEADER_SIZE, \
+    FUNCTION_FOOTER_SIZE
+from ucb_compiler_decompiler_description_words import UPK_FILE_NAME_WORD, OBJECT_NAME_WORD
+from unreal_script_byte_code_compiller_decompiller import cached_decompile_function, write_decompiled_ucb_file, \
+    get_upk_package_context, get_upk_tables_cache_file_name
+from ucb_tools_upk_package_reader import read_upk_package_header
+from ucb_tools_files_cache_manager import ContentAddressedFileCache, DECOMPILED_FUNCTIONS_CACHE_SIZE_BUDGET
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+"""
+
+__author__ = "ButenkoMS <gtalk@butenkoms.space>"
+__copyright__ = "Copyright © 2016 ButenkoMS. All rights reserved. Contacts: <gtalk@butenkoms.space>"
+__credits__ = ["ButenkoMS <gtalk@butenkoms.space>", ]
+__license__ = "Apache License, Version 2.0"
+__version__ = "0.0.1"
+__maintainer__ = "ButenkoMS <gtalk@butenkoms.space>"
+__email__ = "gtalk@butenkoms.space"
+__status__ = "Prototype"
+# __status__ = "Development"
+# __status__ = "Production"
+
+
+UCB_FILE_EXTENSION = '.ucb'
+DESERIALIZED_OBJECT_FILE_EXTENSION = '.txt'
+FUNCTION_CLASS_NAME = 'Function'
+BATCH_DECOMPILE_MANIFEST_FILE_NAME = 'decompile manifest.json'
+BATCH_DECOMPILE_CHUNK_SIZE = 16
+
+_worker_decompile_cache = None
+
+
+def init_decompile_worker(cache_dir, cache_size_budget, package_context_files=None):
+    '''
+    Initializer of the pool's processes: each process opens the decompile cache and loads the tables of the package
+    once, before the first task.
+    :param cache_dir: None - cache is not used
+    :param package_context_files: (info_file_name, tables_cache_file_name) params of the get_upk_package_context();
+        None - tables are loaded on the first use
+    '''
+    global _worker_decompile_cache
+    if cache_dir is None:
+        _worker_decompile_cache = None
+    else:
+        _worker_decompile_cache = ContentAddressedFileCache(cache_dir, cache_size_budget)
+
+    if package_context_files is not None:
+        try:
+            get_upk_package_context(*package_context_files).tables
+        except Exception:
+            # tables are not memoized on error: each task will report it
+            pass
+
+
+def find_function_exports(upk_file_name, deserialized_upk_dir=None):
+    '''
+    Finds all function exports of the unpacked package. Serial offsets and sizes are taken from the per-object .txt
+    files of the deserialized package (<deserialized_upk_dir>/<PackageName>/...) or, when deserialized_upk_dir is
+    None, from the export table of the package itself (see find_function_exports_in_upk_header()). An export is
+    treated as a function when it's serialized data ends with EndOfScript at the same place where
+    get_bytecode_by_name.py expects it.
+    :param upk_file_name: full path to the unpacked .upk (or .u) file
+    :param deserialized_upk_dir: dir with the deserialized packages; None - package is not deserialized
+    :return: list of (object_name, function_byte_code) ordered by object_name
+    '''
+    if deserialized_upk_dir is None:
+        return find_function_exports_in_upk_header(upk_file_name)
+
+    result = list()
+    package_name = os.path.splitext(os.path.basename(upk_file_name))[0]
+    package_dir = os.path.join(deserialized_upk_dir, package_name)
+
+    with open(upk_file_name, 'rb') as file:
+        upk_data = file.read()
+    upk_data_len = len(upk_data)
+
+    for dir_path, dir_names, file_names in os.walk(package_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            object_short_name, file_extension = os.path.splitext(file_name)
+            if file_extension != DESERIALIZED_OBJECT_FILE_EXTENSION:
+                continue
+
+            with open(os.path.join(dir_path, file_name), 'r') as file:
+                data = file.read()
+            if ('SerialOffset:' not in data) or ('SerialSize:' not in data):
+                continue
+
+            serial_offset, serial_size = get_export_serial_info(data)
+            if (serial_size <= FUNCTION_HEADER_SIZE + FUNCTION_FOOTER_SIZE) or \
+                    (serial_offset + serial_size > upk_data_len):
+                continue
+
+            full_function_data = upk_data[serial_offset: serial_offset + serial_size]
+            function_byte_code, is_function_byte_code_ok = get_function_bytecode(full_function_data)
+            if not is_function_byte_code_ok:
+                continue
+
+            relative_dir = os.path.relpath(dir_path, package_dir)
+            object_name_parts = [package_name]
+            if relative_dir != os.curdir:
+                object_name_parts.extend(relative_dir.split(os.sep))
+            object_name_parts.append(object_short_name)
+            result.append(('.'.join(object_name_parts), function_byte_code))
+
+    result.sort(key=lambda item: item[0])
+    return result
+
+
+def find_function_exports_in_upk_header(upk_file_name):
+    '''
+    find_function_exports() without the deserialized package: exports of the Function class are taken from the
+    export table of the package (read_upk_package_header()).
+    :return: list of (object_name, function_byte_code) ordered by object_name
+    '''
+    result = list()
+    package_name = os.path.splitext(os.path.basename(upk_file_name))[0]
+    upk_header = read_upk_package_header(upk_file_name)
+
+    with open(upk_file_name, 'rb') as file:
+        upk_data = file.read()
+    upk_data_len = len(upk_data)
+
+    for export_index, export_entry in enumerate(upk_header.exports):
+        if upk_header.get_export_class_name(export_entry) != FUNCTION_CLASS_NAME:
+            continue
+
+        serial_offset = export_entry.serial_offset
+        serial_size = export_entry.serial_size
+        if (serial_size <= FUNCTION_HEADER_SIZE + FUNCTION_FOOTER_SIZE) or \
+                (serial_offset + serial_size > upk_data_len):
+            continue
+
+        full_function_data = upk_data[serial_offset: serial_offset + serial_size]
+        function_byte_code, is_function_byte_code_ok = get_function_bytecode(full_function_data)
+        if not is_function_byte_code_ok:
+            continue
+
+        object_name = '.'.join([package_name, upk_header.get_object_full_name(export_index + 1)])
+        result.append((object_name, function_byte_code))
+
+    result.sort(key=lambda item: item[0])
+    return result
+
+
+def decompile_function_export(task):
+    '''
+    Worker of the batch_decompile_upk_file(). Runs inside of the pool's process, so it must not raise: errors are
+    returned as a part of the result.
+    :param task: (object_name, upk_file_name, function_byte_code, output_file_name, package_context_files);
+        package_context_files - (info_file_name, tables_cache_file_name) params of the get_upk_package_context()
+    :return: (object_name, output_file_name, is_ok, number_of_found_tokens, memory_size, hex_size, decompile_time,
+        error_text)
+    '''
+    object_name, upk_file_name, function_byte_code, output_file_name, package_context_files = task
+    is_ok = False
+    number_of_found_tokens = 0
+    memory_size = 0
+    hex_size = 0
+    error_text = None
+
+    start_time = time.time()
+    try:
+        package_context = get_upk_package_context(*package_context_files)
+        function = cached_decompile_function(function_byte_code, _worker_decompile_cache,
+                                             package_context=package_context)
+        description_lines = [
+            UPK_FILE_NAME_WORD[0] + upk_file_name,
+            OBJECT_NAME_WORD[0] + object_name,
+        ]
+        write_decompiled_ucb_file(output_file_name, function, description_lines=description_lines)
+        is_ok = function.is_ok
+        number_of_found_tokens = function.number_of_found_tokens
+        memory_size = function.memory_offset
+        hex_size = function.hex_offset
+    except Exception as ex:
+        error_text = '{}: {}'.format(type(ex).__name__, ex)
+    decompile_time = time.time() - start_time
+
+    return object_name, output_file_name, is_ok, number_of_found_tokens, memory_size, hex_size, decompile_time, \
+        error_text
+
+
+def batch_decompile_upk_file(upk_file_name, deserialized_upk_dir, output_dir, max_workers=None,
+                             chunk_size=BATCH_DECOMPILE_CHUNK_SIZE, cache_dir=None,
+                             cache_size_budget=DECOMPILED_FUNCTIONS_CACHE_SIZE_BUDGET, tables_cache_dir=None):
+    '''
+    Decompiles every function export of the unpacked package into the output_dir (one <ObjectName>.ucb file per
+    function). Functions are spread across the ProcessPoolExecutor; each worker process loads the names tables of the
+    package (from the deserialized package dump or, without the deserialized_upk_dir, from the package itself) once,
+    at it's start (see init_decompile_worker()).
+    A manifest with the results (in the same order as the functions were found) and per-function timing is written
+    to the output_dir.
+    :param deserialized_upk_dir: see find_function_exports()
+    :param max_workers: None - number of processors on the machine
+    :param cache_dir: dir of the decompiled functions cache (ContentAddressedFileCache()); None - cache is not used
+    :param tables_cache_dir: dir of the packages' tables caches (see get_upk_tables_cache_file_name()); None - cache
+        is not used
+    :return: (manifest_file_name, list_of_the_decompile_function_export_results)
+    '''
+    upk_file_short_name = os.path.basename(upk_file_name)
+    function_exports = find_function_exports(upk_file_name, deserialized_upk_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    package_info_file_name = upk_file_name
+    if deserialized_upk_dir is not None:
+        package_info_file_name = os.path.join(deserialized_upk_dir, os.path.splitext(upk_file_short_name)[0] +
+                                              DESERIALIZED_OBJECT_FILE_EXTENSION)
+    package_context_files = (package_info_file_name, get_upk_tables_cache_file_name(upk_file_name, tables_cache_dir))
+    # tables cache file is written here once: workers only map it (concurrent writers would replace the file which is
+    # already mapped by the other workers)
+    get_upk_package_context(*package_context_files).tables
+
+    tasks = list()
+    for object_name, function_byte_code in function_exports:
+        output_file_name = os.path.join(output_dir, object_name + UCB_FILE_EXTENSION)
+        tasks.append((object_name, upk_file_short_name, function_byte_code, output_file_name, package_context_files))
+
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers, initializer=init_decompile_worker,
+                             initargs=(cache_dir, cache_size_budget, package_context_files)) as executor:
+        results = list(executor.map(decompile_function_export, tasks, chunksize=chunk_size))
+    total_time = time.time() - start_time
+
+    functions = list()
+    number_of_failed_functions = 0
+    for object_name, output_file_name, is_ok, number_of_found_tokens, memory_size, hex_size, decompile_time, \
+            error_text in results:
+        if not is_ok:
+            number_of_failed_functions += 1
+        functions.append({
+            'object name': object_name,
+            'ucb file': os.path.basename(output_file_name),
+            'is ok': is_ok,
+            'tokens': number_of_found_tokens,
+            'mem size': memory_size,
+            'hex size': hex_size,
+            'decompile time': decompile_time,
+            'error': error_text,
+        })
+
+    manifest = {
+        'upk file': upk_file_short_name,
+        'number of functions': len(functions),
+        'number of failed functions': number_of_failed_functions,
+        'total time': total_time,
+        'functions': functions,
+    }
+    manifest_file_name = os.path.join(output_dir, BATCH_DECOMPILE_MANIFEST_FILE_NAME)
+    with open(manifest_file_name, 'w') as file:
+        json.dump(manifest, file, indent=4)
+
+    return manifest_file_name, results
+
+
+def main():
+    upk_file_name = input('Enter unpacked upk file path: ')
+    deserialized_upk_dir = input('Enter deserialized packages dir (empty - read the package header): ')
+    if len(deserialized_upk_dir) == 0:
+        deserialized_upk_dir = None
+    output_dir = input('Enter output dir: ')
+
+    manifest_file_name, results = batch_decompile_upk_file(upk_file_name, deserialized_upk_dir, output_dir)
+    number_of_failed_functions = len([result for result in results if not result[2]])
+    print()
+    print('DECOMPILED {} FUNCTIONS ({} FAILED).'.format(len(results), number_of_failed_functions))
+    print('MANIFEST: {}'.format(manifest_file_name))
+    print('DONE.')
+
+
+if __name__ == "__main__":
+    main()
@@ -52,6 +52,9 @@ class DirTemplates(DirTemplatesManager):
                 'upk original dir': 'Cache/UPK Original',
                 'upk unpacked dir': 'Cache/UPK Unpacked',
                 'upk deserialized dir': 'Cache/UPK Deserialized',
+                'decompiled functions dir': 'Cache/Decompiled Functions',
+                'compiled functions dir': 'Cache/Compiled Functions',
+                'upk tables dir': 'Cache/UPK Tables',
                 'temp dir': 'Cache/Temp'
             },
             'installation tool': {
@@ -19,6 +19,7 @@ import pickle
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 from contextlib import contextmanager
 
 
@@ -101,3 +102,112 @@ class FileCacheDB:
             # 'deserialized upk hash by original upk hash': dict()
         }
         self.db = db or db_template
+
+
+DECOMPILED_FUNCTIONS_CACHE_SIZE_BUDGET = 256 * 1024 * 1024
+COMPILED_FUNCTIONS_CACHE_SIZE_BUDGET = 64 * 1024 * 1024
+CONTENT_ADDRESSED_CACHE_EVICTION_RATIO = 0.9
+CONTENT_ADDRESSED_CACHE_TEMP_FILE_EXTENSION = '.tmp'
+
+
+class ContentAddressedFileCache:
+    '''
+    On-disk cache of blobs addressed by the hex digest of their origin (<cache_dir>/<key[:2]>/<key>). Entry's mtime is
+    it's last usage time: when the size of the cache exceeds the size_budget, least recently used entries are removed
+    until the size is below size_budget * CONTENT_ADDRESSED_CACHE_EVICTION_RATIO.
+    Can be shared between processes: files are replaced atomically, and a missing file is just a cache miss.
+    In-flight files of the writers (<key>.<pid>.tmp) are never counted or evicted.
+    '''
+    def __init__(self, cache_dir, size_budget=DECOMPILED_FUNCTIONS_CACHE_SIZE_BUDGET):
+        self.cache_dir = cache_dir
+        self.size_budget = size_budget
+        self._current_size = None
+
+    def _get_entry_file_name(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _get_entries(self):
+        '''
+        :return: list of (mtime, size, file_name)
+        '''
+        entries = list()
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.endswith(CONTENT_ADDRESSED_CACHE_TEMP_FILE_EXTENSION):
+                    continue
+                try:
+                    entry_stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+        return entries
+
+    def get(self, key):
+        '''
+        :return: bytes() or None
+        '''
+        file_name = self._get_entry_file_name(key)
+        try:
+            with open(file_name, 'rb') as file:
+                data = file.read()
+            os.utime(file_name)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        file_name = self._get_entry_file_name(key)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        temp_file_name = '{}.{}{}'.format(file_name, os.getpid(), CONTENT_ADDRESSED_CACHE_TEMP_FILE_EXTENSION)
+        with open(temp_file_name, 'wb') as file:
+            file.write(data)
+        try:
+            replaced_size = os.stat(file_name).st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        os.replace(temp_file_name, file_name)
+
+        if self._current_size is None:
+            self._current_size = sum(entry[1] for entry in self._get_entries())
+        else:
+            self._current_size += len(data) - replaced_size
+        if self._current_size > self.size_budget:
+            self.evict()
+
+    def evict(self, target_size=None):
+        '''
+        Removes least recently used entries.
+        :param target_size: None - size_budget * CONTENT_ADDRESSED_CACHE_EVICTION_RATIO
+        '''
+        if target_size is None:
+            target_size = int(self.size_budget * CONTENT_ADDRESSED_CACHE_EVICTION_RATIO)
+        entries = self._get_entries()
+        entries.sort()
+        current_size = sum(entry[1] for entry in entries)
+        for mtime, size, file_name in entries:
+            if current_size <= target_size:
+                break
+            try:
+                os.remove(file_name)
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                # file is opened by the other process (Windows)
+                continue
+            current_size -= size
+        self._current_size = current_size
+
+    def clear(self):
+        self.evict(0)
+
+
+def get_compiled_functions_cache():
+    '''
+    :return: ContentAddressedFileCache() in the "compiled functions dir" of the global file cache
+    '''
+    return ContentAddressedFileCache(FileCacheRegistry().file_cache_dir_template['compiled functions dir'],
+                                     COMPILED_FUNCTIONS_CACHE_SIZE_BUDGET)
@@ -14,6 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 from ucb_tools_config import *
 from ucb_tools_files_cache_manager import *
 try:
@@ -23,6 +24,9 @@ except ImportError:
 from help_tools import filtered_file_list, FilteringType, clear_dir, get_file_hash, IsOK_ContextHolder, is_ok, \
     ResultType, CriteriaType, is_ok_reader, IsOK_BlockFailed
 from upk_helping_tools.upk_utils_api import *
+from ucb_tools_batch_decompiler import batch_decompile_upk_file
+from ucb_tools_project_builder import build_project, watch_project_sources, PROJECT_BUILD_MANIFEST_FILE_NAME, \
+    WATCH_POLL_INTERVAL
 
 
 """
@@ -109,30 +113,10 @@ class UcbToolsKernel:
 
                             context.push_result(True, unpacked_upk_in_temp_hash)
 
-                    with is_ok(context, 'deserialize', ResultType(CriteriaType.needed, {'unpack'})):
-                        if context:
-                            clear_dir(self.file_cache_registry.file_cache_dir_template['temp dir'])
-
-                            unpacked_upk_in_temp_hash = context.read_block_result_copy('unpack').result
-                            unpacked_upk_full_file_name = os.path.join(
-                                    self.file_cache_registry.file_cache_dir_template['upk unpacked dir'],
-                                    unpacked_upk_in_temp_hash,
-                                    original_upk_file)
-                            deserialized_upk_full_dir_path = os.path.join(
-                                    self.file_cache_registry.file_cache_dir_template['upk deserialized dir'],
-                                    unpacked_upk_in_temp_hash)
-
-                            deserialize_result = deserialize_single_upk_file(
-                                    self.global_config.get_property('global', 'upk utils dir'),
-                                    unpacked_upk_full_file_name,
-                                    deserialized_upk_full_dir_path)
-
-                            context.push_result(deserialize_result == 0, deserialize_result)
-
                     with is_ok(context, 'copy upk to the project dir', ResultType(CriteriaType.any, set())):
                         if context:
                             if context.read_block_result_link('original is already in db').existence or \
-                                    context.read_block_result_link('deserialize').existence:
+                                    context.read_block_result_link('unpack').existence:
                                 unpacked_upk_hash = None
 
                                 if context.read_block_result_link('original is already in db').existence:
@@ -185,9 +169,112 @@ class UcbToolsKernel:
         self.unpack_original_upk_files()
         pass
 
-    def compile_project(self):
+    def decompile_upk_files(self, max_workers=None):
+        '''
+        Decompiles every function of each unpacked package of the project into the "Decompiled to UCB" dir
+        (a subdir per package). Function exports are found through the export table of each unpacked package.
+        :return: list of the manifest file names
+        '''
         self.unpack_original_upk_files()
-        pass
+
+        result = list()
+        func_context = IsOK_ContextHolder('UCB Tools Kernel - decompile_upk_files()')
+
+        with is_ok(func_context, 'main'):
+            if func_context:
+                unpacked_upk_dir_path, unpacked_upk_dir_names, unpacked_upk_file_names = filtered_file_list(
+                        self.project_dir_template['upk unpacked dir'], FilteringType.off)
+
+                for unpacked_upk_file in unpacked_upk_file_names:
+                    unpacked_upk_full_file_name = os.path.join(unpacked_upk_dir_path, unpacked_upk_file)
+                    output_dir = os.path.join(self.project_dir_template['decompiled to UCB '],
+                                              os.path.splitext(unpacked_upk_file)[0])
+
+                    manifest_file_name, decompile_results = batch_decompile_upk_file(
+                            unpacked_upk_full_file_name, None, output_dir, max_workers,
+                            cache_dir=self.file_cache_registry.file_cache_dir_template['decompiled functions dir'],
+                            tables_cache_dir=self.file_cache_registry.file_cache_dir_template['upk tables dir'])
+                    result.append(manifest_file_name)
+
+        with is_ok_reader(func_context):
+            if not func_context:
+                func_context.raise_bad_blocks()
+
+        return result
+
+    def compile_project(self, max_workers=None):
+        '''
+        Incremental build of the "work source dir": only the sources with changed inputs are recompiled (into the
+        "compiled hex code" and the "compiled to UPK Utils' code" dirs) and repatched into the "upk patched dir".
+        State of the build is kept in the project's settings dir (see build_project()). Changed sources are compiled
+        in parallel.
+        :param max_workers: None - number of processors on the machine
+        :return: (compile_results, patch_results) of the build_project()
+        '''
+        self.unpack_original_upk_files()
+        return self.build_work_sources(max_workers)
+
+    def build_work_sources(self, max_workers=None):
+        '''
+        compile_project() without the unpacking of the original upk files.
+        '''
+        result = None
+        func_context = IsOK_ContextHolder('UCB Tools Kernel - build_work_sources()')
+
+        with is_ok(func_context, 'main'):
+            if func_context:
+                compile_results, patch_results = build_project(
+                        self.project_dir_template['work source dir'],
+                        self.project_dir_template['compiled hex code'],
+                        self.project_dir_template['compiled to UPK Utils\' code'],
+                        self.project_dir_template['upk unpacked dir'],
+                        self.project_dir_template['upk patched dir'],
+                        os.path.join(self.project_settings_dir, PROJECT_BUILD_MANIFEST_FILE_NAME),
+                        self.global_config.get_property('global', 'upk utils dir'),
+                        max_workers,
+                        cache_dir=self.file_cache_registry.file_cache_dir_template['compiled functions dir'],
+                        tables_cache_dir=self.file_cache_registry.file_cache_dir_template['upk tables dir'])
+                result = (compile_results, patch_results)
+
+                errors = list()
+                for compile_result in compile_results:
+                    if not compile_result[1]:
+                        errors.append('"{}": {}'.format(compile_result[0], compile_result[7]))
+                for upk_file_name, is_patch_ok, error_text in patch_results:
+                    if not is_patch_ok:
+                        errors.append('"{}": {}'.format(upk_file_name, error_text))
+                if errors:
+                    raise IsOK_BlockFailed('Project build failed:\n{}'.format('\n'.join(errors)))
+
+        with is_ok_reader(func_context):
+            if not func_context:
+                func_context.raise_bad_blocks()
+
+        return result
+
+    def watch_project(self, need_to_install=False, poll_interval=WATCH_POLL_INTERVAL):
+        '''
+        Watch mode: original upk files are unpacked once, then the "work source dir" is polled and the changed sources
+        are recompiled and repatched (and the project is installed if need_to_install) right after they are saved.
+        Sources are compiled in the current process, where the names tables and the token plans stay loaded
+        between the builds.
+        Build errors are printed and the watching is continued. Stops on the KeyboardInterrupt.
+        '''
+        self.unpack_original_upk_files()
+
+        def on_change():
+            start_time = time.time()
+            try:
+                compile_results, patch_results = self.build_work_sources(1)
+                if need_to_install:
+                    self.install_project()
+            except Exception as ex:
+                print('BUILD FAILED: {}'.format(ex))
+            else:
+                print('BUILT {} CHANGED SOURCES, PATCHED {} UPK FILES IN {} SECONDS.'.format(
+                        len(compile_results), len(patch_results), time.time() - start_time))
+
+        watch_project_sources(self.project_dir_template['work source dir'], on_change, poll_interval)
 
     def install_project(self):
         func_context = IsOK_ContextHolder('UCB Tools Kernel - install_project()')
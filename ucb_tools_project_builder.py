@@ -0,0 +1,527 @@
+#!/usr/bin/env python
+
+# Copyright © 2016 ButenkoMS. All rights reserved. Contacts: <gtalk@butenkoms.space>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os.path
+import time
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from help_tools import bytes__to__hex_string, IsOK_BlockFailed
+from upk_helping_tools.upk_utils_api import patch_upk_file
+from ucb_compiler_decompiler_description_words import DESCRIPTION_WORD, UPK_FILE_NAME_WORD, OBJECT_NAME_WORD
+from unreal_script_byte_code_compiller_decompiller import cached_full_compile, compile__get_tokens, \
+    compile__get_cache_key, CompileQuotesExceptionMissedRQuote, get_upk_package_context, \
+    get_upk_tables_cache_file_name, get_file_hash_by_stat
+from ucb_tools_files_cache_manager import ContentAddressedFileCache, COMPILED_FUNCTIONS_CACHE_SIZE_BUDGET
+from ucb_tools_batch_decompiler import UCB_FILE_EXTENSION
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+"""
+
+__author__ = "ButenkoMS <gtalk@butenkoms.space>"
+__copyright__ = "Copyright © 2016 ButenkoMS. All rights reserved. Contacts: <gtalk@butenkoms.space>"
+__credits__ = ["ButenkoMS <gtalk@butenkoms.space>", ]
+__license__ = "Apache License, Version 2.0"
+__version__ = "0.0.1"
+__maintainer__ = "ButenkoMS <gtalk@butenkoms.space>"
+__email__ = "gtalk@butenkoms.space"
+__status__ = "Prototype"
+# __status__ = "Development"
+# __status__ = "Production"
+
+
+PROJECT_BUILD_MANIFEST_FILE_NAME = 'build manifest.json'
+COMPILED_HEX_FILE_EXTENSION = '.fbc'
+UPK_UTILS_MOD_FILE_EXTENSION = '.txt'
+PROJECT_BUILD_CHUNK_SIZE = 1
+WATCH_POLL_INTERVAL = 0.25
+
+_worker_compile_cache = None
+_project_sources_info = dict()
+
+
+def init_compile_worker(cache_dir, cache_size_budget, packages_context_files=tuple()):
+    '''
+    Initializer of the pool's processes: each process opens the compile cache and loads the names tables of the
+    build's packages once, before the first task (see get_upk_package_context()).
+    :param cache_dir: None - cache is not used
+    :param packages_context_files: list of the get_project_package_context_files() results (not None)
+    '''
+    global _worker_compile_cache
+    if cache_dir is None:
+        _worker_compile_cache = None
+    else:
+        _worker_compile_cache = ContentAddressedFileCache(cache_dir, cache_size_budget)
+
+    for package_context_files in packages_context_files:
+        try:
+            get_project_package_context(package_context_files).tables
+        except Exception:
+            # tables are not memoized on error: each task of the package will report it
+            pass
+
+
+def get_ucb_source_targets(source_code):
+    '''
+    Reads the UPK_FILE_NAME and the OBJECT_NAME preprocessor words from the description of the .ucb source.
+    :return: (upk_file_name, object_name); None for the word which is not found
+    '''
+    upk_file_name = None
+    object_name = None
+
+    description_begin = source_code.find(DESCRIPTION_WORD[0])
+    description_end = source_code.find(DESCRIPTION_WORD[1])
+    if (description_begin < 0) or (description_end < description_begin):
+        return upk_file_name, object_name
+
+    description = source_code[description_begin + len(DESCRIPTION_WORD[0]): description_end]
+    for line in description.splitlines():
+        line = line.strip()
+        if (upk_file_name is None) and line.startswith(UPK_FILE_NAME_WORD[0]):
+            upk_file_name = line[len(UPK_FILE_NAME_WORD[0]):].strip()
+        elif (object_name is None) and line.startswith(OBJECT_NAME_WORD[0]):
+            object_name = line[len(OBJECT_NAME_WORD[0]):].strip()
+    return upk_file_name, object_name
+
+
+def get_project_source_info(source_file_name):
+    '''
+    Reads the source, it's targets and it's tokens. Result is kept until the (st_mtime_ns, st_size) of the source is
+    changed, so the unchanged sources are not read and lexed again by the next builds in the same process (see
+    watch_project_sources()). Must not raise: read errors are returned as a part of the result.
+    :return: (source_code, upk_file_name, object_name, tokens_list, error_text); tokens_list is None if the source
+        can't be split to tokens; error_text is None if the source was read (else all the rest is None)
+    '''
+    try:
+        source_stat = os.stat(source_file_name)
+        source_state = (source_stat.st_mtime_ns, source_stat.st_size)
+        known_state_and_info = _project_sources_info.get(source_file_name)
+        if (known_state_and_info is not None) and (known_state_and_info[0] == source_state):
+            return known_state_and_info[1]
+
+        with open(source_file_name, 'r') as file:
+            source_code = file.read()
+    except (OSError, UnicodeError) as ex:
+        return None, None, None, None, '{}: {}'.format(type(ex).__name__, ex)
+
+    upk_file_name, object_name = get_ucb_source_targets(source_code)
+    try:
+        tokens_list, tokens_positions = compile__get_tokens(source_code)
+    except (CompileQuotesExceptionMissedRQuote, IsOK_BlockFailed):
+        tokens_list = None
+
+    source_info = (source_code, upk_file_name, object_name, tokens_list, None)
+    _project_sources_info[source_file_name] = (source_state, source_info)
+    return source_info
+
+
+def get_project_package_context_files(unpacked_upk_dir, upk_file_name, tables_cache_dir):
+    '''
+    Tables of the source's package are read from the unpacked package itself (see read_upk_package_header()).
+    :return: (info_file_name, tables_cache_file_name) params of the get_upk_package_context(); None when the package
+        is unknown or is not unpacked yet (sources of such package are not compiled)
+    '''
+    if upk_file_name is None:
+        return None
+    unpacked_upk_file_name = os.path.join(unpacked_upk_dir, upk_file_name)
+    if not os.path.isfile(unpacked_upk_file_name):
+        return None
+    return unpacked_upk_file_name, get_upk_tables_cache_file_name(unpacked_upk_file_name, tables_cache_dir)
+
+
+def get_project_package_context(package_context_files):
+    '''
+    :param package_context_files: not None result of the get_project_package_context_files()
+    :return: UpkPackageContext()
+    '''
+    return get_upk_package_context(*package_context_files)
+
+
+def get_upk_utils_object_name(upk_file_name, object_name):
+    '''
+    OBJECT_NAME of the batch decompiler starts with the package name, while UPK Utils expects the name inside of the
+    package: XComGame.XGAbility_Targeted.RollForHit -> XGAbility_Targeted.RollForHit
+    '''
+    package_prefix = os.path.splitext(upk_file_name)[0] + '.'
+    if object_name.startswith(package_prefix):
+        object_name = object_name[len(package_prefix):]
+    return object_name
+
+
+def make_upk_utils_mod_file_content(upk_file_name, object_name, compiled_hex_code):
+    mod_file_content_strings = [
+        'MOD_NAME={}'.format(object_name),
+        'AUTHOR=',
+        'DESCRIPTION= ',
+        'UPK_FILE={}'.format(upk_file_name),
+        'OBJECT={}:AUTO'.format(get_upk_utils_object_name(upk_file_name, object_name)),
+        '[REPLACEMENT_CODE]',
+        compiled_hex_code,
+    ]
+    return '\n'.join(mod_file_content_strings)
+
+
+def find_project_sources(work_source_dir):
+    '''
+    :return: sorted list of the .ucb files' names relative to the work_source_dir (with '/' as a separator)
+    '''
+    result = list()
+    for dir_path, dir_names, file_names in os.walk(work_source_dir):
+        for file_name in file_names:
+            if os.path.splitext(file_name)[1] != UCB_FILE_EXTENSION:
+                continue
+            relative_file_name = os.path.relpath(os.path.join(dir_path, file_name), work_source_dir)
+            result.append(relative_file_name.replace(os.sep, '/'))
+    result.sort()
+    return result
+
+
+def load_build_manifest(manifest_file_name):
+    manifest = {
+        'sources': dict(),
+        'patched upk files': dict(),
+    }
+    if os.path.isfile(manifest_file_name):
+        with open(manifest_file_name, 'r') as file:
+            manifest.update(json.load(file))
+    return manifest
+
+
+def save_build_manifest(manifest_file_name, manifest):
+    os.makedirs(os.path.dirname(manifest_file_name), exist_ok=True)
+    temp_file_name = '{}.{}.tmp'.format(manifest_file_name, os.getpid())
+    with open(temp_file_name, 'w') as file:
+        json.dump(manifest, file, indent=4, sort_keys=True)
+    os.replace(temp_file_name, manifest_file_name)
+
+
+def compile_project_source(task):
+    '''
+    Compiles single source of the project into the compiled hex (.fbc) file and into the UPK Utils mod file. Must not
+    raise: errors are returned as a part of the result.
+    :param task: (source_name, source_code, upk_file_name, object_name, compiled_hex_file_name, mod_file_name,
+        package_context_files); package_context_files - see get_project_package_context_files()
+    :return: (source_name, is_ok, number_of_found_tokens, memory_size, hex_size, is_taken_from_cache, compile_time,
+        error_text)
+    '''
+    source_name, source_code, upk_file_name, object_name, compiled_hex_file_name, mod_file_name, \
+        package_context_files = task
+    is_ok = False
+    number_of_found_tokens = 0
+    memory_size = 0
+    hex_size = 0
+    is_taken_from_cache = False
+    error_text = None
+
+    start_time = time.time()
+    try:
+        if (upk_file_name is None) or (object_name is None):
+            raise ValueError('Source has no {} or no {} in it\'s description'.format(UPK_FILE_NAME_WORD[0],
+                                                                                     OBJECT_NAME_WORD[0]))
+        if package_context_files is None:
+            raise ValueError('Package "{}" is unknown or is not unpacked yet'.format(upk_file_name))
+
+        compile_result, is_taken_from_cache = cached_full_compile(
+                source_code, _worker_compile_cache, get_project_package_context(package_context_files))
+        compiled_hex_code = bytes__to__hex_string(compile_result[0])
+
+        with open(compiled_hex_file_name, 'w') as file:
+            file.write(compiled_hex_code)
+        with open(mod_file_name, 'w') as file:
+            file.write(make_upk_utils_mod_file_content(upk_file_name, object_name, compiled_hex_code))
+
+        is_ok = True
+        number_of_found_tokens = compile_result[1]
+        memory_size = compile_result[2]
+        hex_size = compile_result[3]
+    except Exception as ex:
+        error_text = '{}: {}'.format(type(ex).__name__, ex)
+    compile_time = time.time() - start_time
+
+    return source_name, is_ok, number_of_found_tokens, memory_size, hex_size, is_taken_from_cache, compile_time, \
+        error_text
+
+
+def patch_project_upk_file(upk_utils_dir, unpacked_upk_file_name, patched_upk_dir, mod_file_names,
+                           is_full_rebuild):
+    '''
+    :param is_full_rebuild: True - patched package is copied from the unpacked one first
+    :return: (is_ok, error_text)
+    '''
+    if is_full_rebuild:
+        os.makedirs(patched_upk_dir, exist_ok=True)
+        shutil.copyfile(unpacked_upk_file_name,
+                        os.path.join(patched_upk_dir, os.path.basename(unpacked_upk_file_name)))
+
+    for mod_file_name in mod_file_names:
+        patch_result = patch_upk_file(upk_utils_dir, patched_upk_dir, mod_file_name, False)
+        if patch_result != 0:
+            return False, 'Patch by "{}" failed with exitcode "{}"'.format(mod_file_name, patch_result)
+    return True, None
+
+
+def build_project(work_source_dir, compiled_hex_dir, mod_files_dir, unpacked_upk_dir, patched_upk_dir,
+                  manifest_file_name, upk_utils_dir, max_workers=None, chunk_size=PROJECT_BUILD_CHUNK_SIZE,
+                  cache_dir=None, cache_size_budget=COMPILED_FUNCTIONS_CACHE_SIZE_BUDGET, tables_cache_dir=None):
+    '''
+    Incremental build of the project. The build manifest keeps the key of each source (compile__get_cache_key(): it
+    changes with the source's tokens and with the names and token tables) and it's OBJECT_NAME/UPK_FILE_NAME. Only
+    the sources with changed inputs are recompiled. Patched package is updated by the changed sources' mod files
+    only; it is rebuilt from the unpacked one when it's unpacked package or the patched file itself was changed, or
+    when some of it's sources were removed or were retargeted. Source which fails to compile (or to be read) keeps
+    it's last good patch: it's error is reported by the compile results.
+    Each source is compiled with the tables of it's own package (UPK_FILE_NAME), so sources of the different packages
+    are built together.
+    Sources are lexed and packages are hashed again only when their (st_mtime_ns, st_size) is changed (see
+    get_project_source_info() and get_file_hash_by_stat()).
+    Changed sources are compiled in parallel by the ProcessPoolExecutor (results are in the order of the tasks);
+    packages are patched sequentially.
+    :param max_workers: None - number of processors on the machine; 1 - sources are compiled in the current process
+    :param cache_dir: dir of the compiled functions cache (ContentAddressedFileCache()); None - cache is not used
+    :param tables_cache_dir: dir of the packages' tables caches (see get_upk_tables_cache_file_name()); None - cache
+        is not used
+    :return: (compile_results, patch_results): compile_results - list of the compile_project_source() results of the
+        changed sources in the order of the find_project_sources(); patch_results - list of (upk_file_name, is_ok,
+        error_text)
+    '''
+    manifest = load_build_manifest(manifest_file_name)
+    old_sources = manifest['sources']
+    new_sources = dict()
+    os.makedirs(compiled_hex_dir, exist_ok=True)
+    os.makedirs(mod_files_dir, exist_ok=True)
+
+    tasks = list()
+    source_keys = dict()
+    changed_source_names = list()
+    unread_source_names = list()
+    compile_results_by_source_name = dict()
+    package_context_files_by_upk = dict()
+    for source_name in find_project_sources(work_source_dir):
+        source_file_name = os.path.join(work_source_dir, source_name)
+        source_code, upk_file_name, object_name, tokens_list, error_text = get_project_source_info(source_file_name)
+        if error_text is not None:
+            # result of the compile_project_source() for the source which can't be read
+            changed_source_names.append(source_name)
+            unread_source_names.append(source_name)
+            compile_results_by_source_name[source_name] = (source_name, False, 0, 0, 0, False, 0.0, error_text)
+            continue
+
+        if upk_file_name not in package_context_files_by_upk:
+            package_context_files_by_upk[upk_file_name] = get_project_package_context_files(
+                    unpacked_upk_dir, upk_file_name, tables_cache_dir)
+        package_context_files = package_context_files_by_upk[upk_file_name]
+        if package_context_files is None:
+            # the task will fail with the error of the source: the default package's tables must not be used
+            source_key = None
+        elif tokens_list is None:
+            source_key = None
+        else:
+            source_key = compile__get_cache_key(tokens_list, get_project_package_context(package_context_files))
+
+        output_name = source_name.replace('/', '.')
+        output_name = os.path.splitext(output_name)[0]
+        compiled_hex_file_name = os.path.join(compiled_hex_dir, output_name + COMPILED_HEX_FILE_EXTENSION)
+        mod_file_name = os.path.join(mod_files_dir, output_name + UPK_UTILS_MOD_FILE_EXTENSION)
+
+        source_record = old_sources.get(source_name)
+        if (source_record is not None) and (source_key is not None) and \
+                (source_record['source key'] == source_key) and \
+                (source_record['upk file name'] == upk_file_name) and \
+                (source_record['object name'] == object_name) and \
+                os.path.isfile(source_record['mod file']):
+            new_sources[source_name] = source_record
+            continue
+
+        changed_source_names.append(source_name)
+        source_keys[source_name] = source_key
+        tasks.append((source_name, source_code, upk_file_name, object_name, compiled_hex_file_name, mod_file_name,
+                      package_context_files))
+
+    packages_context_files = list()
+    for task in tasks:
+        package_context_files = task[6]
+        if (package_context_files is not None) and (package_context_files not in packages_context_files):
+            packages_context_files.append(package_context_files)
+
+    tasks_compile_results = list()
+    if tasks and (max_workers == 1):
+        # in the current process: it's tables are already loaded
+        init_compile_worker(cache_dir, cache_size_budget, packages_context_files)
+        tasks_compile_results = list(map(compile_project_source, tasks))
+    elif tasks:
+        with ProcessPoolExecutor(max_workers, initializer=init_compile_worker,
+                                 initargs=(cache_dir, cache_size_budget, packages_context_files)) as executor:
+            tasks_compile_results = list(executor.map(compile_project_source, tasks, chunksize=chunk_size))
+    for compile_result in tasks_compile_results:
+        compile_results_by_source_name[compile_result[0]] = compile_result
+    compile_results = [compile_results_by_source_name[source_name] for source_name in changed_source_names]
+
+    changed_mod_files_by_upk = dict()
+    upk_files_to_rebuild = set()
+    for task, compile_result in zip(tasks, tasks_compile_results):
+        source_name, source_code, upk_file_name, object_name, compiled_hex_file_name, mod_file_name, \
+            package_context_files = task
+        source_record = old_sources.get(source_name)
+        is_retargeted = (source_record is not None) and \
+            ((source_record['upk file name'] != upk_file_name) or (source_record['object name'] != object_name))
+        if is_retargeted:
+            upk_files_to_rebuild.add(source_record['upk file name'])
+        if not compile_result[1]:
+            if (source_record is not None) and (not is_retargeted) and os.path.isfile(source_record['mod file']):
+                # last good patch of the source stays until the source is fixed, removed or retargeted
+                new_sources[source_name] = source_record
+            continue
+
+        new_sources[source_name] = {
+            'source key': source_keys[source_name],
+            'upk file name': upk_file_name,
+            'object name': object_name,
+            'mod file': mod_file_name,
+            'memory size': compile_result[3],
+            'hex size': compile_result[4],
+        }
+        changed_mod_files_by_upk.setdefault(upk_file_name, list()).append(mod_file_name)
+
+    for source_name in unread_source_names:
+        # targets of the source are unknown: it's last good patch stays until the source is fixed or removed
+        source_record = old_sources.get(source_name)
+        if (source_record is not None) and os.path.isfile(source_record['mod file']):
+            new_sources[source_name] = source_record
+
+    for source_name, source_record in old_sources.items():
+        if source_name not in new_sources:
+            # source was removed or retargeted: it's old patch must be undone
+            upk_files_to_rebuild.add(source_record['upk file name'])
+
+    mod_files_by_upk = dict()
+    for source_name in sorted(new_sources):
+        source_record = new_sources[source_name]
+        mod_files_by_upk.setdefault(source_record['upk file name'], list()).append(source_record['mod file'])
+
+    patch_results = list()
+    old_patched_upk_files = manifest['patched upk files']
+    new_patched_upk_files = dict()
+    for upk_file_name in sorted(set(mod_files_by_upk) | upk_files_to_rebuild):
+        unpacked_upk_file_name = os.path.join(unpacked_upk_dir, upk_file_name)
+        patched_upk_file_name = os.path.join(patched_upk_dir, upk_file_name)
+        unpacked_upk_hash = get_file_hash_by_stat(unpacked_upk_file_name)
+
+        patched_upk_record = old_patched_upk_files.get(upk_file_name)
+        is_full_rebuild = (upk_file_name in upk_files_to_rebuild) or (patched_upk_record is None) or \
+            (patched_upk_record['unpacked upk hash'] != unpacked_upk_hash) or \
+            (not os.path.isfile(patched_upk_file_name)) or \
+            (get_file_hash_by_stat(patched_upk_file_name) != patched_upk_record['patched upk hash'])
+        if is_full_rebuild:
+            mod_file_names = mod_files_by_upk.get(upk_file_name, list())
+        else:
+            mod_file_names = changed_mod_files_by_upk.get(upk_file_name, list())
+            if not mod_file_names:
+                new_patched_upk_files[upk_file_name] = patched_upk_record
+                continue
+
+        is_ok, error_text = patch_project_upk_file(upk_utils_dir, unpacked_upk_file_name, patched_upk_dir,
+                                                   mod_file_names, is_full_rebuild)
+        patch_results.append((upk_file_name, is_ok, error_text))
+        if is_ok:
+            new_patched_upk_files[upk_file_name] = {
+                'unpacked upk hash': unpacked_upk_hash,
+                'patched upk hash': get_file_hash_by_stat(patched_upk_file_name),
+            }
+        else:
+            # sources of the package will be recompiled and the package will be rebuilt from scratch next time
+            for source_name, source_record in list(new_sources.items()):
+                if source_record['upk file name'] == upk_file_name:
+                    del new_sources[source_name]
+
+    manifest['sources'] = new_sources
+    manifest['patched upk files'] = new_patched_upk_files
+    save_build_manifest(manifest_file_name, manifest)
+
+    return compile_results, patch_results
+
+
+def get_project_sources_state(work_source_dir):
+    '''
+    :return: dict() {source_name: (mtime_ns, size)} for the find_project_sources()
+    '''
+    result = dict()
+    for source_name in find_project_sources(work_source_dir):
+        try:
+            source_stat = os.stat(os.path.join(work_source_dir, source_name))
+        except FileNotFoundError:
+            continue
+        result[source_name] = (source_stat.st_mtime_ns, source_stat.st_size)
+    return result
+
+
+def watch_project_sources(work_source_dir, on_change, poll_interval=WATCH_POLL_INTERVAL, max_number_of_changes=None):
+    '''
+    Polls the work_source_dir and calls the on_change() after the start and after each change of the sources (a
+    source is added, removed or saved). Runs in the current process, so the names tables, the token plans and the
+    compile cache stay loaded between the builds. Stops on the KeyboardInterrupt.
+    :param on_change: callable without params
+    :param max_number_of_changes: None - watch forever
+    :return: number of the on_change() calls
+    '''
+    number_of_changes = 0
+    last_state = None
+    try:
+        while (max_number_of_changes is None) or (number_of_changes < max_number_of_changes):
+            state = get_project_sources_state(work_source_dir)
+            if state != last_state:
+                last_state = state
+                on_change()
+                number_of_changes += 1
+            else:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    return number_of_changes
+
+
+def main():
+    work_source_dir = input('Enter work source dir: ')
+    compiled_hex_dir = input('Enter compiled hex dir: ')
+    mod_files_dir = input('Enter UPK Utils mod files dir: ')
+    unpacked_upk_dir = input('Enter unpacked upk files dir: ')
+    patched_upk_dir = input('Enter patched upk files dir: ')
+    upk_utils_dir = input('Enter UPK Utils dir: ')
+    manifest_file_name = os.path.join(patched_upk_dir, PROJECT_BUILD_MANIFEST_FILE_NAME)
+
+    start_time = time.time()
+    compile_results, patch_results = build_project(work_source_dir, compiled_hex_dir, mod_files_dir,
+                                                   unpacked_upk_dir, patched_upk_dir, manifest_file_name,
+                                                   upk_utils_dir)
+    total_time = time.time() - start_time
+
+    print()
+    for compile_result in compile_results:
+        if not compile_result[1]:
+            print('COMPILATION FAILED "{}": {}'.format(compile_result[0], compile_result[7]))
+    for upk_file_name, is_ok, error_text in patch_results:
+        if not is_ok:
+            print('PATCHING FAILED "{}": {}'.format(upk_file_name, error_text))
+    number_of_failed_sources = len([result for result in compile_results if not result[1]])
+    print('COMPILED {} CHANGED SOURCES ({} FAILED), PATCHED {} UPK FILES IN {} SECONDS.'.format(
+            len(compile_results), number_of_failed_sources, len(patch_results), total_time))
+    print('DONE.')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+# Copyright © 2016 ButenkoMS. All rights reserved. Contacts: <gtalk@butenkoms.space>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os.path
+import mmap
+import struct
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+"""
+
+__author__ = "ButenkoMS <gtalk@butenkoms.space>"
+__copyright__ = "Copyright © 2016 ButenkoMS. All rights reserved. Contacts: <gtalk@butenkoms.space>"
+__credits__ = ["ButenkoMS <gtalk@butenkoms.space>", ]
+__license__ = "Apache License, Version 2.0"
+__version__ = "0.0.1"
+__maintainer__ = "ButenkoMS <gtalk@butenkoms.space>"
+__email__ = "gtalk@butenkoms.space"
+__status__ = "Prototype"
+# __status__ = "Development"
+# __status__ = "Production"
+
+
+UPK_PACKAGE_FILE_EXTENSIONS = {'.upk', '.u'}
+UPK_PACKAGE_SIGNATURE = 0x9E2A83C1
+# ImportExportGuidsOffset, ImportGuidsCount, ExportGuidsCount and ThumbnailTableOffset are in the summary
+# (XCOM packages are of the version 845)
+UPK_PACKAGE_MIN_SUPPORTED_VERSION = 623
+
+# signature, version, licensee version, header size
+UPK_SUMMARY_BEGIN_STRUCT = struct.Struct('<IHHi')
+# package flags, name count, name offset, export count, export offset, import count, import offset, depends offset,
+# import export guids offset, import guids count, export guids count, thumbnail table offset, guid, generations count
+UPK_SUMMARY_TABLES_STRUCT = struct.Struct('<I11i16si')
+UPK_SUMMARY_GENERATION_SIZE = 12  # export count, name count, net object count
+# engine version, cooker version, compression flags, number of compressed chunks
+UPK_SUMMARY_END_STRUCT = struct.Struct('<iiIi')
+UPK_NAME_FLAGS_SIZE = 8
+# package name index, package name number, class name index, class name number, owner ref, name index, name number
+UPK_IMPORT_STRUCT = struct.Struct('<7i')
+# class ref, super ref, owner ref, name index, name number, archetype ref, object flags, serial size, serial offset,
+# export flags, net objects count
+UPK_EXPORT_STRUCT = struct.Struct('<6iQiiIi')
+UPK_EXPORT_TAIL_SIZE = 16 + 4  # package guid, package flags
+INT32_STRUCT = struct.Struct('<i')
+
+
+class UpkImportEntry:
+    __slots__ = ('package_name', 'class_name', 'owner_ref', 'name')
+
+    def __init__(self, package_name, class_name, owner_ref, name):
+        self.package_name = package_name
+        self.class_name = class_name
+        self.owner_ref = owner_ref
+        self.name = name
+
+
+class UpkExportEntry:
+    __slots__ = ('class_ref', 'super_ref', 'owner_ref', 'name', 'archetype_ref', 'object_flags', 'serial_size',
+                 'serial_offset', 'export_flags')
+
+    def __init__(self, class_ref, super_ref, owner_ref, name, archetype_ref, object_flags, serial_size, serial_offset,
+                 export_flags):
+        self.class_ref = class_ref
+        self.super_ref = super_ref
+        self.owner_ref = owner_ref
+        self.name = name
+        self.archetype_ref = archetype_ref
+        self.object_flags = object_flags
+        self.serial_size = serial_size
+        self.serial_offset = serial_offset
+        self.export_flags = export_flags
+
+
+class UpkPackageHeader:
+    '''
+    Name, import and export tables of the unpacked UE3 package.
+    Object reference: 0 - none; > 0 - exports[ref - 1]; < 0 - imports[-ref - 1]
+    '''
+    def __init__(self, version, licensee_version, package_flags, names, imports, exports):
+        self.version = version
+        self.licensee_version = licensee_version
+        self.package_flags = package_flags
+        self.names = names
+        self.imports = imports
+        self.exports = exports
+
+    def get_object(self, object_ref):
+        '''
+        :return: UpkExportEntry(), UpkImportEntry() or None
+        '''
+        if object_ref > 0:
+            return self.exports[object_ref - 1]
+        elif object_ref < 0:
+            return self.imports[-object_ref - 1]
+        return None
+
+    def get_object_full_name(self, object_ref):
+        '''
+        :return: names of the owners and of the object joined by '.' (as in the UPK Utils' dump): "Class.Function"
+        '''
+        parts = list()
+        max_depth = len(self.imports) + len(self.exports)
+        while (object_ref != 0) and (len(parts) <= max_depth):
+            entry = self.get_object(object_ref)
+            parts.append(entry.name)
+            object_ref = entry.owner_ref
+        parts.reverse()
+        return '.'.join(parts)
+
+    def get_export_class_name(self, export_entry):
+        if 0 == export_entry.class_ref:
+            return 'Class'
+        return self.get_object(export_entry.class_ref).name
+
+    def get_tables(self):
+        '''
+        :return: (name_table, import_table, export_table) - dict(bin_id: name) each, the same as the tables of the
+            get_names_table_and_import_table() (bin_id is the name index or the object reference as int32)
+        '''
+        name_table = dict()
+        for name_index, name in enumerate(self.names):
+            name_table[INT32_STRUCT.pack(name_index)] = name
+
+        import_table = dict()
+        for import_index in range(len(self.imports)):
+            object_ref = -import_index - 1
+            import_table[INT32_STRUCT.pack(object_ref)] = self.get_object_full_name(object_ref)
+
+        export_table = dict()
+        for export_index in range(len(self.exports)):
+            object_ref = export_index + 1
+            export_table[INT32_STRUCT.pack(object_ref)] = self.get_object_full_name(object_ref)
+
+        return name_table, import_table, export_table
+
+
+def upk_read_string(data, offset):
+    '''
+    FString: int32 length (with the trailing zero); negative length - UTF-16 string
+    :return: (string, next_offset)
+    '''
+    length = INT32_STRUCT.unpack_from(data, offset)[0]
+    offset += INT32_STRUCT.size
+    if length >= 0:
+        end = offset + length
+        string = data[offset: end].rstrip(b'\x00').decode('latin-1')
+    else:
+        end = offset - 2 * length
+        string = data[offset: end].decode('utf-16-le').rstrip('\x00')
+    if end > len(data):
+        raise ValueError('String at {} is out of the package'.format(offset))
+    return string, end
+
+
+def upk_get_name(names, name_index, name_number):
+    name = names[name_index]
+    if name_number > 0:
+        name = '{}_{}'.format(name, name_number - 1)
+    return name
+
+
+def read_upk_package_header(upk_file_name):
+    '''
+    Reads the package summary and the name, import and export tables of the unpacked (not compressed) UE3 package
+    through the memory map, without the UPK Utils' deserializer.
+    :return: UpkPackageHeader()
+    '''
+    with open(upk_file_name, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            signature, version, licensee_version, header_size = UPK_SUMMARY_BEGIN_STRUCT.unpack_from(data, 0)
+            if UPK_PACKAGE_SIGNATURE != signature:
+                raise ValueError('"{}" is not an UE3 package'.format(upk_file_name))
+            if version < UPK_PACKAGE_MIN_SUPPORTED_VERSION:
+                raise ValueError('Package "{}" has unsupported version {}'.format(upk_file_name, version))
+
+            folder_name, offset = upk_read_string(data, UPK_SUMMARY_BEGIN_STRUCT.size)
+            package_flags, name_count, name_offset, export_count, export_offset, import_count, import_offset, \
+                depends_offset, import_export_guids_offset, import_guids_count, export_guids_count, \
+                thumbnail_table_offset, guid, generations_count = UPK_SUMMARY_TABLES_STRUCT.unpack_from(data, offset)
+            offset += UPK_SUMMARY_TABLES_STRUCT.size + UPK_SUMMARY_GENERATION_SIZE * generations_count
+            engine_version, cooker_version, compression_flags, compressed_chunks_count = \
+                UPK_SUMMARY_END_STRUCT.unpack_from(data, offset)
+            if compressed_chunks_count > 0:
+                raise ValueError('Package "{}" is compressed: it must be unpacked first'.format(upk_file_name))
+
+            names = list()
+            offset = name_offset
+            for name_index in range(name_count):
+                name, offset = upk_read_string(data, offset)
+                offset += UPK_NAME_FLAGS_SIZE
+                names.append(name)
+
+            imports = list()
+            offset = import_offset
+            for import_index in range(import_count):
+                package_name_index, package_name_number, class_name_index, class_name_number, owner_ref, \
+                    name_index, name_number = UPK_IMPORT_STRUCT.unpack_from(data, offset)
+                offset += UPK_IMPORT_STRUCT.size
+                imports.append(UpkImportEntry(upk_get_name(names, package_name_index, package_name_number),
+                                              upk_get_name(names, class_name_index, class_name_number),
+                                              owner_ref,
+                                              upk_get_name(names, name_index, name_number)))
+
+            exports = list()
+            offset = export_offset
+            for export_index in range(export_count):
+                class_ref, super_ref, owner_ref, name_index, name_number, archetype_ref, object_flags, serial_size, \
+                    serial_offset, export_flags, net_objects_count = UPK_EXPORT_STRUCT.unpack_from(data, offset)
+                offset += UPK_EXPORT_STRUCT.size + 4 * net_objects_count + UPK_EXPORT_TAIL_SIZE
+                exports.append(UpkExportEntry(class_ref, super_ref, owner_ref,
+                                              upk_get_name(names, name_index, name_number), archetype_ref,
+                                              object_flags, serial_size, serial_offset, export_flags))
+
+    return UpkPackageHeader(version, licensee_version, package_flags, names, imports, exports)
+
+
+def is_upk_package_file(file_name):
+    return os.path.splitext(file_name)[1].lower() in UPK_PACKAGE_FILE_EXTENSIONS
@@ -20,7 +20,6 @@ import os.path
 import shutil, errno
 import subprocess
 import time
-import copy
 import binascii
 import time
 import json
@@ -28,11 +27,17 @@ import sys
 from enum import Enum
 import IDGenerator
 import struct
+import re
+import hashlib
+import pickle
+import mmap
+import zlib
+import threading
 from help_tools import IsOK_ContextHolder, is_ok, is_ok_reader, ResultType, CriteriaType, IsOK_BlockFailed, \
-    PLATFORM_NAME, hex_string__to__bytes, solid_hex_string__to__bytes, bytes__to__hex_string, float_to_bytes, \
-    bytes_to_float, bytes_to_int, int_to_bytes, bytes_to_short, short_to_bytes, byte_to_bytes, bytes_to_byte, \
-    IsOK_IntenalResultType, IsOK_IntenalResult, IsOK_HistoryExport
+    hex_string__to__bytes, solid_hex_string__to__bytes, bytes__to__hex_string, short_to_bytes, \
+    IsOK_IntenalResultType, IsOK_IntenalResult, IsOK_HistoryExport, get_file_hash
 from upk_helping_tools.upk_constants import FileExtensions
+from ucb_tools_upk_package_reader import read_upk_package_header, is_upk_package_file
 
 
 """
@@ -242,6 +247,9 @@ class Token:
         self.name = self._token_data[1]
         self.params = self._token_data[2]
         self.termination = self._token_data[3]
+        self.decode_runs = None  # see decompile__build_decode_runs()
+        self.encode_plan = None  # see compile__build_encode_plan()
+        self.size_plan = None  # see compile__build_size_plan()
 
     def __getitem__(self, key):
         return self._token_data[key]
@@ -661,6 +669,63 @@ for code_table in US_CODE_TABLES_LIST:
 
 US_CODE_TABLE__ALL_TOKENS = Tokens(_US_CODE_TABLE__ALL_TOKENS)
 
+
+class TokensDispatchTable:
+    '''
+    Tokens indexed by the first byte of their code. Prefix codes (0x38, 0x61, 0x62, ...) have a second level table
+    indexed by the second byte. Two-byte codes have a priority over one-byte codes (same as in the token_by_code
+    lookup: working[:2] first and working[:1] after it).
+    '''
+    def __init__(self, tokens):
+        self.token_by_first_byte = [None] * 256
+        self.subtable_by_first_byte = [None] * 256
+        for token in tokens.tokens:
+            code = token.code
+            if 1 == len(code):
+                self.token_by_first_byte[code[0]] = token
+            elif 2 == len(code):
+                subtable = self.subtable_by_first_byte[code[0]]
+                if subtable is None:
+                    subtable = [None] * 256
+                    self.subtable_by_first_byte[code[0]] = subtable
+                subtable[code[1]] = token
+            else:
+                raise ValueError('Token code {} is longer than 2 bytes'.format(token.code))
+
+    def find_token(self, input_view, hex_offset):
+        '''
+        :param input_view: memoryview() or bytes()
+        :param hex_offset: position of the token code
+        :return: Token() or None
+        '''
+        input_view_len = len(input_view)
+        if hex_offset >= input_view_len:
+            return None
+        first_byte = input_view[hex_offset]
+        subtable = self.subtable_by_first_byte[first_byte]
+        if (subtable is not None) and (hex_offset + 1 < input_view_len):
+            token = subtable[input_view[hex_offset + 1]]
+            if token is not None:
+                return token
+        return self.token_by_first_byte[first_byte]
+
+US_CODE_TABLE__DISPATCH = TokensDispatchTable(US_CODE_TABLE__ALL_TOKENS)
+
+
+def get_token_tables_fingerprint(tokens, token_types):
+    '''
+    Changes on every change of the token tables or of the token types: used as the "token table version".
+    :return: hex digest str()
+    '''
+    fingerprint = hashlib.sha1()
+    for token_type in token_types.types:
+        fingerprint.update(str(token_type).encode())
+    for token in tokens.tokens:
+        fingerprint.update(str(token).encode())
+    return fingerprint.hexdigest()
+
+US_CODE_TABLE__FINGERPRINT = get_token_tables_fingerprint(US_CODE_TABLE__ALL_TOKENS, TOKEN_TYPES)
+
 DESCRIPTION_BEGIN_WORD = '/*DESCRIPTION_BEGIN*/'
 DESCRIPTION_END_WORD = '/*DESCRIPTION_END*/'
 LANGUAGE_VERSION_WORD = ['/*LANGUAGE_VERSION=', '*/']
@@ -679,107 +744,483 @@ LANGUAGE_VERSION = 0
 #         XCOMGAMEUPK__NAMES_TABLE__ID_BY_NAME[name] = int_name_id
 
 
-if 'PyPy' == PLATFORM_NAME:
-    def parce_nametables_line(line):
-        line = line.split(': ')
-        id_line_data = line[0]
-        name = line[1]
-        id_line_data = ''.join(id_line_data.split())
-        id_line_data = id_line_data.split(')(')
-        id_line_data = id_line_data[1][:-1]
-        bin_id = binascii.unhexlify(id_line_data.encode())
-        result = (bin_id, name)
-        return result
-else:
-    def parce_nametables_line(line):
-        line = line.split(': ')
-        id_line_data = line[0]
-        name = line[1]
-        id_line_data = ''.join(id_line_data.split())
-        id_line_data = id_line_data.split(')(')
-        id_line_data = id_line_data[1][:-1]
-        bin_id = binascii.unhexlify(id_line_data)
-        result = (bin_id, name)
-        return result
-
+# "0x00000000 (0) (00 00 00 00): Name": bin_id hex and name of the table entry
+DUMP_TABLE_ENTRY_RE = re.compile(r'^0x[0-9A-Fa-f]+ \(-?\d+\) \(([0-9A-Fa-f ]+)\): ([^\n]*)', re.MULTILINE)
+DUMP_TABLE_SECTION_NAMES = ('NameTable:', 'ImportTable:', 'ExportTable:')
+DUMP_READ_BLOCK_SIZE = 64 * 1024
 
-def get_names_table_and_import_table(file_name):
-    data = None
-    with open(file_name, 'r') as file:
-        data = file.read()
-    data = data.split('\n\n')
 
+def get_names_table_and_import_table(file_name, block_size=DUMP_READ_BLOCK_SIZE):
+    '''
+    Streaming parser of the deserialized package dump (<PackageName>.txt of the UPK Utils). Sections are separated by
+    the empty lines; section is recognised by it's first line ("NameTable:", "ImportTable:", "ExportTable:"; the last
+    of the other sections is the header). Dump is read by the blocks of whole lines, and entries of the table sections
+    are parsed by the DUMP_TABLE_ENTRY_RE right inside of the block, so only the block and the resulting tables are
+    kept in memory. Lines which are not entries are skipped.
+    :param block_size: size of the read block (in characters)
+    :return: (header, (name_table, import_table, export_table)); header - list of lines; tables - dict(bin_id: name)
+    '''
     header = list()
-    name_table = list()
-    import_table = list()
-    export_table = list()
-
-    for part in data:
-        part_lines = part.split('\n')
-        if part_lines[0] == 'NameTable:':
-            name_table = part_lines[1:]
-        elif part_lines[0] == 'ImportTable:':
-            import_table = part_lines[1:]
-        elif part_lines[0] == 'ExportTable:':
-            export_table = part_lines[1:]
-        else:
-            header = part_lines
+    tables = dict()
+    for section_name in DUMP_TABLE_SECTION_NAMES:
+        tables[section_name] = dict()
 
-    tables = (name_table, import_table, export_table)
-    result_tables = list()
-    for table in tables:
-        table_dict = dict()
-        for line in table:
-            try:
-                result_line = parce_nametables_line(line)
-            except IndexError:
-                pass
+    section = None  # None - at the beginning of the section; header list() or table dict() otherwise
+    rest = ''
+    with open(file_name, 'r') as file:
+        is_finished = False
+        while not is_finished:
+            block = file.read(block_size)
+            data = rest + block
+            if block:
+                data_end = data.rfind('\n') + 1
+                rest = data[data_end:]
+                data = data[:data_end]
             else:
-                table_dict[result_line[0]] = result_line[1]
-        result_tables.append(table_dict)
+                is_finished = True
+                rest = ''
+
+            position = 0
+            data_len = len(data)
+            while position < data_len:
+                if section is None:
+                    line_end = data.find('\n', position)
+                    if line_end < 0:
+                        line_end = data_len
+                    line = data[position:line_end]
+                    section = tables.get(line)
+                    if section is None:
+                        header = [line]
+                        section = header
+                    position = line_end + 1
+                    continue
+
+                # section ends at the empty line
+                if '\n' == data[position]:
+                    section_end = position
+                else:
+                    section_end = data.find('\n\n', position)
+                    if section_end < 0:
+                        section_end = data_len
+                    else:
+                        section_end += 1
 
-    # name_table, import_table, export_table = result_tables
+                if section is header:
+                    header.extend(data[position:section_end].splitlines())
+                else:
+                    entries = DUMP_TABLE_ENTRY_RE.findall(data, position, section_end)
+                    if entries:
+                        bin_ids_hex, names = zip(*entries)
+                        if data.count(': ', position, section_end) > len(entries):
+                            # name ends at the next ': ' (if any)
+                            names = [name.split(': ', 1)[0] for name in names]
+                        section.update(zip(map(bytes.fromhex, bin_ids_hex), names))
+
+                if section_end < data_len:
+                    section = None
+                    position = section_end + 1
+                else:
+                    position = data_len
 
+    result_tables = [tables[section_name] for section_name in DUMP_TABLE_SECTION_NAMES]
     result = (header, result_tables)
     return result
 
 
 UPK__INFO__FILENAME = r"C:\Development\XCOM Modding\Work\CookedPCConsole_Deserialized\XComGame.txt"
 
-# UPK__NAMES_TABLE = dict()
-# UPK__IMPORT_TABLE = dict()
-# UPK__EXPORT_TABLE = dict()
-UPK__NAMES_TABLE__NAME_BY_ID = dict()
-UPK__IMPORT_TABLE__NAME_BY_ID = dict()
-UPK__EXPORT_TABLE__NAME_BY_ID = dict()
-UPK__NAMES_TABLE__ID_BY_NAME = dict()
-UPK__IMPORT_TABLE__ID_BY_NAME = dict()
-UPK__EXPORT_TABLE__ID_BY_NAME = dict()
-
-UPK__NAMES__NAME_BY_ID = dict()
-UPK__NAMES__ID_BY_NAME = dict()
-UPK__NAMES = dict()
-
-UPK_INFO_HEADER, UPK_TABLES = get_names_table_and_import_table(UPK__INFO__FILENAME)
-UPK__NAMES_TABLE, UPK__IMPORT_TABLE, UPK__EXPORT_TABLE = UPK_TABLES
-UPK__NAMES.update(UPK__EXPORT_TABLE)
-UPK__NAMES.update(UPK__IMPORT_TABLE)
-for bin_id, name in UPK__NAMES.items():
-        UPK__NAMES__NAME_BY_ID[bin_id] = name
-        UPK__NAMES__ID_BY_NAME[name] = bin_id
-for bin_id, name in UPK__NAMES_TABLE.items():
-        UPK__NAMES_TABLE__NAME_BY_ID[bin_id] = name
-        UPK__NAMES_TABLE__ID_BY_NAME[name] = bin_id
-for bin_id, name in UPK__IMPORT_TABLE.items():
-        UPK__IMPORT_TABLE__NAME_BY_ID[bin_id] = name
-        UPK__IMPORT_TABLE__ID_BY_NAME[name] = bin_id
-for bin_id, name in UPK__EXPORT_TABLE.items():
-        UPK__EXPORT_TABLE__NAME_BY_ID[bin_id] = name
-        UPK__EXPORT_TABLE__ID_BY_NAME[name] = bin_id
-print('UPK__NAMES qnt: {}'.format(len(UPK__NAMES)))
-print('UPK__NAMES_TABLE qnt: {}'.format(len(UPK__NAMES_TABLE)))
-print('UPK__IMPORT_TABLE qnt: {}'.format(len(UPK__IMPORT_TABLE)))
-print('UPK__EXPORT_TABLE qnt: {}'.format(len(UPK__EXPORT_TABLE)))
+
+def get_names_tables_fingerprint(names_tables):
+    '''
+    :param names_tables: list of dict(bin_id: name)
+    :return: hex digest str()
+    '''
+    fingerprint = hashlib.sha1()
+    for names_table in names_tables:
+        for bin_id, name in sorted(names_table.items()):
+            fingerprint.update(bin_id)
+            fingerprint.update(name.encode())
+            fingerprint.update(b'\x00')
+        fingerprint.update(b'\xFF')
+    return fingerprint.hexdigest()
+
+
+class UpkPackageTables:
+    '''
+    Parsed names, import and export tables of the package (see get_names_table_and_import_table()).
+    names: import and export tables together (names of the objects)
+    '''
+    def __init__(self, header, names_table, import_table, export_table):
+        self.header = header
+        self.names_table = names_table
+        self.import_table = import_table
+        self.export_table = export_table
+
+        self.names = dict()
+        self.names.update(export_table)
+        self.names.update(import_table)
+
+        self.names_table__name_by_id = dict(names_table)
+        self.names_table__id_by_name = {name: bin_id for bin_id, name in names_table.items()}
+        self.import_table__name_by_id = dict(import_table)
+        self.import_table__id_by_name = {name: bin_id for bin_id, name in import_table.items()}
+        self.export_table__name_by_id = dict(export_table)
+        self.export_table__id_by_name = {name: bin_id for bin_id, name in export_table.items()}
+        self.names__name_by_id = dict(self.names)
+        self.names__id_by_name = {name: bin_id for bin_id, name in self.names.items()}
+
+        self.fingerprint = get_names_tables_fingerprint([self.names_table, self.names])
+
+    def get_tables_sizes(self):
+        '''
+        :return: (names_qnt, names_table_qnt, import_table_qnt, export_table_qnt)
+        '''
+        return len(self.names), len(self.names_table), len(self.import_table), len(self.export_table)
+
+
+UPK_TABLES_CACHE_FILE_EXTENSION = '.upktables'
+UPK_TABLES_CACHE_MAGIC = b'UPKT'
+UPK_TABLES_CACHE_VERSION = 1
+# magic, version, fingerprint, names qnt, names table qnt, import table qnt, export table qnt
+UPK_TABLES_CACHE_HEADER_STRUCT = struct.Struct('<4sI40sIIII')
+# entries qnt, entries offset, hash slots qnt, id hash offset, name hash offset
+UPK_TABLES_CACHE_TABLE_STRUCT = struct.Struct('<IIIII')
+# id offset, id size, name offset, name size (offsets are inside of the string pool)
+UPK_TABLES_CACHE_ENTRY_STRUCT = struct.Struct('<IIII')
+UPK_TABLES_CACHE_SLOT_STRUCT = struct.Struct('<I')
+UPK_TABLES_CACHE_EMPTY_SLOT = 0xFFFFFFFF
+
+
+def upk_tables_cache__build_table(table, string_pool, data_offset):
+    '''
+    :param table: dict(bin_id: name)
+    :param string_pool: bytearray(); ids and names of the table are appended to it. Entries address them relative to
+        the pool: it is placed after the data of all tables, so it's offset is not known yet
+    :param data_offset: offset of the table's data inside of the file
+    :return: (table_descriptor_bytes, table_data_bytes)
+    '''
+    entries = bytearray()
+    names = list()
+    for bin_id, name in table.items():
+        name_data = name.encode()
+        id_offset = len(string_pool)
+        string_pool += bin_id
+        name_offset = len(string_pool)
+        string_pool += name_data
+        entries += UPK_TABLES_CACHE_ENTRY_STRUCT.pack(id_offset, len(bin_id), name_offset, len(name_data))
+        names.append(name_data)
+
+    slots_qnt = 1
+    while slots_qnt < 2 * len(table):
+        slots_qnt *= 2
+    id_slots = [UPK_TABLES_CACHE_EMPTY_SLOT] * slots_qnt
+    name_slots = [UPK_TABLES_CACHE_EMPTY_SLOT] * slots_qnt
+    for entry_index, (bin_id, name_data) in enumerate(zip(table, names)):
+        slot = zlib.crc32(bin_id) & (slots_qnt - 1)
+        while id_slots[slot] != UPK_TABLES_CACHE_EMPTY_SLOT:
+            slot = (slot + 1) & (slots_qnt - 1)
+        id_slots[slot] = entry_index
+
+        # the same name may have several ids: the last one wins (as in the dict(name: bin_id))
+        slot = zlib.crc32(name_data) & (slots_qnt - 1)
+        while (name_slots[slot] != UPK_TABLES_CACHE_EMPTY_SLOT) and (names[name_slots[slot]] != name_data):
+            slot = (slot + 1) & (slots_qnt - 1)
+        name_slots[slot] = entry_index
+
+    slots_format = '<{}I'.format(slots_qnt)
+    data = bytes(entries) + struct.pack(slots_format, *id_slots) + struct.pack(slots_format, *name_slots)
+    entries_offset = data_offset
+    id_hash_offset = entries_offset + len(entries)
+    name_hash_offset = id_hash_offset + 4 * slots_qnt
+    descriptor = UPK_TABLES_CACHE_TABLE_STRUCT.pack(len(table), entries_offset, slots_qnt, id_hash_offset,
+                                                    name_hash_offset)
+    return descriptor, data
+
+
+def write_upk_tables_cache_file(file_name, tables):
+    '''
+    Binary cache of the package tables: header, descriptors of the names table and of the names (import and export
+    tables together), their fixed width entries and open addressing hash indexes (by id and by name) and the string
+    pool with all ids and names. It is used through the mmap by the MappedUpkPackageTables().
+    :param tables: UpkPackageTables()
+    '''
+    descriptors_size = 2 * UPK_TABLES_CACHE_TABLE_STRUCT.size
+    data_offset = UPK_TABLES_CACHE_HEADER_STRUCT.size + descriptors_size
+    parts = list()
+    descriptors = list()
+    string_pool = bytearray()
+    for table in (tables.names_table, tables.names):
+        descriptor, data = upk_tables_cache__build_table(table, string_pool, data_offset)
+        descriptors.append(descriptor)
+        parts.append(data)
+        data_offset += len(data)
+
+    header = UPK_TABLES_CACHE_HEADER_STRUCT.pack(UPK_TABLES_CACHE_MAGIC, UPK_TABLES_CACHE_VERSION,
+                                                 tables.fingerprint.encode(), *tables.get_tables_sizes())
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    temp_file_name = '{}.{}.tmp'.format(file_name, os.getpid())
+    with open(temp_file_name, 'wb') as file:
+        file.write(header)
+        file.write(b''.join(descriptors))
+        file.write(b''.join(parts))
+        file.write(string_pool)
+    os.replace(temp_file_name, file_name)
+
+
+class MappedNamesTableView:
+    '''
+    Read only dict-like view (get(), in, []) of the single mapping of the MappedUpkPackageTables(). Found items are
+    memoized, so the hot lookups cost the same as with the dict().
+    '''
+    def __init__(self, buffer, string_pool_offset, table_descriptor, is_by_name):
+        self._buffer = buffer
+        self._string_pool_offset = string_pool_offset
+        self._entries_qnt, self._entries_offset, self._slots_qnt, id_hash_offset, name_hash_offset = \
+            table_descriptor
+        self._hash_offset = name_hash_offset if is_by_name else id_hash_offset
+        self._is_by_name = is_by_name
+        self._memo = dict()
+
+    def __len__(self):
+        return self._entries_qnt
+
+    def _find(self, key):
+        buffer = self._buffer
+        string_pool_offset = self._string_pool_offset
+        # as with the dict(): key of the other type is just not found
+        if self._is_by_name:
+            if not isinstance(key, str):
+                return None
+            key_data = key.encode()
+        else:
+            if not isinstance(key, bytes):
+                return None
+            key_data = key
+        slot_mask = self._slots_qnt - 1
+        slot = zlib.crc32(key_data) & slot_mask
+        while True:
+            entry_index = UPK_TABLES_CACHE_SLOT_STRUCT.unpack_from(buffer, self._hash_offset + 4 * slot)[0]
+            if UPK_TABLES_CACHE_EMPTY_SLOT == entry_index:
+                return None
+            id_offset, id_size, name_offset, name_size = UPK_TABLES_CACHE_ENTRY_STRUCT.unpack_from(
+                    buffer, self._entries_offset + UPK_TABLES_CACHE_ENTRY_STRUCT.size * entry_index)
+            id_offset += string_pool_offset
+            name_offset += string_pool_offset
+            bin_id = buffer[id_offset: id_offset + id_size]
+            name_data = buffer[name_offset: name_offset + name_size]
+            if self._is_by_name:
+                if name_data == key_data:
+                    return bin_id
+            elif bin_id == key_data:
+                return name_data.decode()
+            slot = (slot + 1) & slot_mask
+
+    def get(self, key, default=None):
+        result = self._memo.get(key)
+        if result is None:
+            result = self._find(key)
+            if result is None:
+                return default
+            self._memo[key] = result
+        return result
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        result = self.get(key)
+        if result is None:
+            raise KeyError(key)
+        return result
+
+
+class MappedUpkPackageTables:
+    '''
+    UpkPackageTables() interface over the mmap of the write_upk_tables_cache_file() file: nothing is parsed up front,
+    lookups go through the hash indexes. Has only the names table and the names lookups (the ones used by the
+    compiler and by the decompiler) and the fingerprint.
+    '''
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, fingerprint, self.names_qnt, self.names_table_qnt, self.import_table_qnt, \
+            self.export_table_qnt = UPK_TABLES_CACHE_HEADER_STRUCT.unpack_from(self._mmap, 0)
+        if (UPK_TABLES_CACHE_MAGIC != magic) or (UPK_TABLES_CACHE_VERSION != version):
+            self._mmap.close()
+            raise ValueError('"{}" is not an UPK tables cache file of the version {}'.format(
+                    file_name, UPK_TABLES_CACHE_VERSION))
+        self.fingerprint = fingerprint.decode()
+
+        descriptors_offset = UPK_TABLES_CACHE_HEADER_STRUCT.size
+        names_table_descriptor = UPK_TABLES_CACHE_TABLE_STRUCT.unpack_from(self._mmap, descriptors_offset)
+        names_descriptor = UPK_TABLES_CACHE_TABLE_STRUCT.unpack_from(
+                self._mmap, descriptors_offset + UPK_TABLES_CACHE_TABLE_STRUCT.size)
+        # string pool follows the data of the last table
+        string_pool_offset = names_descriptor[4] + 4 * names_descriptor[2]
+
+        self.names_table__name_by_id = MappedNamesTableView(self._mmap, string_pool_offset, names_table_descriptor,
+                                                            False)
+        self.names_table__id_by_name = MappedNamesTableView(self._mmap, string_pool_offset, names_table_descriptor,
+                                                            True)
+        self.names__name_by_id = MappedNamesTableView(self._mmap, string_pool_offset, names_descriptor, False)
+        self.names__id_by_name = MappedNamesTableView(self._mmap, string_pool_offset, names_descriptor, True)
+
+    def get_tables_sizes(self):
+        return self.names_qnt, self.names_table_qnt, self.import_table_qnt, self.export_table_qnt
+
+    def close(self):
+        self._mmap.close()
+
+
+class UpkPackageContext:
+    '''
+    Tables of the single package: deserialized package file (<PackageName>.txt of the UPK Utils) is read and parsed
+    on the first use of the tables, so the tools which need only the token tables never load it.
+    The info_file_name may also be the unpacked package itself (.upk or .u): then its header is read directly
+    (see read_upk_package_header()) and no deserialization is needed.
+    When the tables_cache_file_name is set, parsed tables are saved there (see write_upk_tables_cache_file()) and
+    the next loads just map that file (MappedUpkPackageTables()).
+    Tables are loaded once even when the first use is from several threads at the same time.
+    '''
+    def __init__(self, info_file_name, tables_cache_file_name=None):
+        self.info_file_name = info_file_name
+        self.tables_cache_file_name = tables_cache_file_name
+        self._tables = None
+        self._tables_lock = threading.Lock()
+
+    def is_loaded(self):
+        return self._tables is not None
+
+    def _load_tables(self):
+        if (self.tables_cache_file_name is not None) and os.path.isfile(self.tables_cache_file_name):
+            try:
+                return MappedUpkPackageTables(self.tables_cache_file_name)
+            except (ValueError, struct.error):
+                pass
+
+        if is_upk_package_file(self.info_file_name):
+            header = read_upk_package_header(self.info_file_name)
+            tables = header.get_tables()
+        else:
+            header, tables = get_names_table_and_import_table(self.info_file_name)
+        tables = UpkPackageTables(header, *tables)
+        if self.tables_cache_file_name is not None:
+            write_upk_tables_cache_file(self.tables_cache_file_name, tables)
+        return tables
+
+    @property
+    def tables(self):
+        '''
+        :return: UpkPackageTables() or MappedUpkPackageTables()
+        '''
+        if self._tables is None:
+            with self._tables_lock:
+                if self._tables is None:
+                    tables = self._load_tables()
+                    names_qnt, names_table_qnt, import_table_qnt, export_table_qnt = tables.get_tables_sizes()
+                    print('UPK__NAMES qnt: {}'.format(names_qnt))
+                    print('UPK__NAMES_TABLE qnt: {}'.format(names_table_qnt))
+                    print('UPK__IMPORT_TABLE qnt: {}'.format(import_table_qnt))
+                    print('UPK__EXPORT_TABLE qnt: {}'.format(export_table_qnt))
+                    self._tables = tables
+        return self._tables
+
+
+UPK_PACKAGE_CONTEXTS = dict()
+UPK_PACKAGE_CONTEXTS_LOCK = threading.Lock()
+
+
+def get_upk_package_context(info_file_name=UPK__INFO__FILENAME, tables_cache_file_name=None):
+    '''
+    :param info_file_name: deserialized package file or the unpacked package (.upk or .u) itself
+    :param tables_cache_file_name: binary tables cache file (see UpkPackageContext()); None - cache is not used
+    :return: UpkPackageContext() of the package; it is created once per package and tables cache file (tables are
+        not loaded here)
+    '''
+    package_key = (os.path.normcase(os.path.abspath(info_file_name)), tables_cache_file_name)
+    with UPK_PACKAGE_CONTEXTS_LOCK:
+        context = UPK_PACKAGE_CONTEXTS.get(package_key)
+        if context is None:
+            context = UpkPackageContext(info_file_name, tables_cache_file_name)
+            UPK_PACKAGE_CONTEXTS[package_key] = context
+    return context
+
+UPK_PACKAGE_CONTEXT = get_upk_package_context(UPK__INFO__FILENAME)
+
+FILE_HASHES = dict()
+FILE_HASHES_LOCK = threading.Lock()
+
+
+def get_file_hash_by_stat(file_name):
+    '''
+    get_file_hash() of the file which is computed again only when the (st_mtime_ns, st_size) of the file is changed:
+    packages are hashed once per process (e.g. by the builds of the watch_project_sources()), not on the each use.
+    :return: hex digest str()
+    '''
+    file_key = os.path.normcase(os.path.abspath(file_name))
+    file_stat = os.stat(file_name)
+    file_state = (file_stat.st_mtime_ns, file_stat.st_size)
+    with FILE_HASHES_LOCK:
+        known_state_and_hash = FILE_HASHES.get(file_key)
+    if (known_state_and_hash is not None) and (known_state_and_hash[0] == file_state):
+        return known_state_and_hash[1]
+
+    file_hash = get_file_hash(file_name)
+    with FILE_HASHES_LOCK:
+        FILE_HASHES[file_key] = (file_state, file_hash)
+    return file_hash
+
+
+def get_upk_tables_cache_file_name(upk_file_name, tables_cache_dir):
+    '''
+    :param upk_file_name: unpacked package
+    :return: tables cache file of the package inside of the tables_cache_dir (it's name is the hash of the package, so
+        the changed package gets the new cache file); None if tables_cache_dir is None
+    '''
+    if tables_cache_dir is None:
+        return None
+    return os.path.join(tables_cache_dir, get_file_hash_by_stat(upk_file_name) + UPK_TABLES_CACHE_FILE_EXTENSION)
+
+
+class DecompileContext:
+    '''
+    Explicit state of the single decompilation: tables of the package and the labels. Nothing is shared between
+    decompilations except the (read only) package tables, so functions of the different packages may be decompiled
+    in the same process and from the different threads.
+    '''
+    __slots__ = ('package_context', 'labels_dict', 'labels_id_generator')
+
+    def __init__(self, package_context=None, labels_dict=None, labels_id_generator=None):
+        '''
+        :param package_context: UpkPackageContext(); None - UPK_PACKAGE_CONTEXT
+        '''
+        self.package_context = package_context or UPK_PACKAGE_CONTEXT
+        self.labels_dict = labels_dict or dict()
+        self.labels_id_generator = labels_id_generator or IDGenerator.IDGenerator()
+
+    @property
+    def tables(self):
+        return self.package_context.tables
+
+
+class CompileContext:
+    '''
+    Explicit state of the single compilation (see DecompileContext()): tables of the package, known labels and
+    forward jumps to be patched (see compile__apply_label_fixups()).
+    '''
+    __slots__ = ('package_context', 'labels_dict', 'label_fixups')
+
+    def __init__(self, package_context=None, labels_dict=None):
+        '''
+        :param package_context: UpkPackageContext(); None - UPK_PACKAGE_CONTEXT
+        '''
+        self.package_context = package_context or UPK_PACKAGE_CONTEXT
+        self.labels_dict = labels_dict or dict()
+        self.label_fixups = list()
+
+    @property
+    def tables(self):
+        return self.package_context.tables
 
 
 SET_OF_DELIMITERS = {',', '(', ')'}
@@ -848,52 +1289,111 @@ def decompile__get_current_label_text(labels_dict, label_mem_offset):
     return label_text
 
 
-def compile__detect_and_init_new_label(working_token_list, labels_dict, current_token_mem_offset):
-    current_token = working_token_list[0]
+class CompileParser:
+    '''
+    Cursor over the immutable tuple of the source tokens: tokens are consumed by moving the position, never by copying.
+    '''
+    __slots__ = ('tokens', 'position', 'tokens_qnt')
+
+    def __init__(self, tokens, position=0):
+        self.tokens = tuple(tokens)
+        self.position = position
+        self.tokens_qnt = len(self.tokens)
+
+    def is_finished(self):
+        return self.position >= self.tokens_qnt
+
+    def peek(self, shift=0):
+        '''
+        :return: token (without consuming it); raises IndexError at the end of the tokens
+        '''
+        position = self.position + shift
+        if position >= self.tokens_qnt:
+            raise IndexError('list index out of range')
+        return self.tokens[position]
+
+    def take(self):
+        '''
+        :return: consumed token; raises IndexError at the end of the tokens
+        '''
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def get_remaining_tokens(self, position=None):
+        '''
+        :param position: None - current position
+        :return: list of the tokens starting from the position
+        '''
+        if position is None:
+            position = self.position
+        return list(self.tokens[position:])
+
+
+def compile__detect_and_init_new_label(parser, labels_dict, current_token_mem_offset):
+    current_token = parser.peek()
     if current_token.startswith('@'):
         if current_token[1:] == PREPROCESSOR_TOKENS.label_token:
-            label_id = working_token_list[1]
-            working_token_list = working_token_list[2:]
+            label_id = parser.peek(1)
+            parser.position += 2
             labels_dict[label_id] = current_token_mem_offset
 
-    return working_token_list
-
 
-def compile__detect_known_label(current_token, working_token_list, labels_dict, first_pass=False):
+def compile__detect_known_label(current_token, parser, labels_dict):
     '''
-    :param current_token:
-    :param first_pass:
-    :param working_token_list:
-    :param labels_dict:
-    :return: can be None (when label_id is not found)
+    Consumes label id (for the "@to_label" current_token) from the parser.
+    :param current_token: already consumed token
+    :return: bytecode of the label's memory offset; None when label_id is not found
     '''
-
     current_working_token = current_token
 
     try:
         if current_token.startswith('@'):
             if current_token[1:] == PREPROCESSOR_TOKENS.to_label_token:
-                label_id = working_token_list[0]
+                label_id = parser.take()
                 current_working_token = label_id
                 label_mem_offset = labels_dict.get(label_id)
                 if label_mem_offset is not None:
                     label_mem_offset = struct.pack('<H', int(label_mem_offset))
-                working_token_list[0] = label_mem_offset
+                result = label_mem_offset
+            else:
+                result = parser.take()
         else:
             # if jump to hex code, not to label
-            param_bytecode = solid_hex_string__to__bytes(current_token)
-            working_token_list.insert(0, param_bytecode)
+            result = solid_hex_string__to__bytes(current_token)
     except binascii.Error as ex:
         raise UnresolvableNameReference('', current_working_token)
 
-    return working_token_list
+    return result
+
 
+def compile__translate_known_label_to_mem_offset(current_token, parser, labels_dict, label_fixups, hex_offset,
+                                                 token_name):
+    '''
+    Label which is not known yet (forward jump) is compiled as b'\x00\x00' and registered in the label_fixups as
+    (hex_offset, label_id, token_name): it will be patched by the compile__apply_label_fixups().
+    '''
+    label_id_position = parser.position
+    result = compile__detect_known_label(current_token, parser, labels_dict)
+    if result is None:
+        result = b'\x00\x00'
+        label_fixups.append((hex_offset, parser.tokens[label_id_position], token_name))
+    return result
 
-def compile__translate_known_label_to_mem_offset(current_token, working_token_list, labels_dict, first_pass=False):
-    working_token_list = compile__detect_known_label(current_token, working_token_list, labels_dict, first_pass)
-    if working_token_list[0] is None:
-        working_token_list[0] = b'\x00\x00'
-    return working_token_list
+
+def compile__apply_label_fixups(output, label_fixups, labels_dict):
+    '''
+    Writes memory offsets of the forward jumps' labels in place. Labels which are still unknown are left as
+    b'\x00\x00'.
+    :param output: CompileOutput() of the whole function
+    '''
+    for hex_offset, label_id, token_name in label_fixups:
+        label_mem_offset = labels_dict.get(label_id)
+        if label_mem_offset is not None:
+            try:
+                output.pack_at(COMPILE_MEM_OFF_STRUCT, hex_offset, int(label_mem_offset))
+            except struct.error as ex:
+                raise CompileValueError(str(ex), token_name, label_id)
 
 
 def debug_print(need_to_print_out=False, spacing_string=None, data_string=None):
@@ -903,269 +1403,590 @@ def debug_print(need_to_print_out=False, spacing_string=None, data_string=None):
         print(spacing_string + data_string)
 
 
-def decompile_token(input_data, labels_dict, labels_id_generator, spacing=None, d_print=None, memory_offset=None,
-                    hex_offset=None):
+class DecompiledToken:
+    '''
+    AST node of the decompiled token. token is None for the unknown token.
+    params: list of DecompiledToken() (sub expressions) and DecompiledParam() (fixed size params)
+    '''
+    __slots__ = ('token', 'memory_offset', 'hex_offset', 'params')
+
+    def __init__(self, token, memory_offset, hex_offset):
+        self.token = token
+        self.memory_offset = memory_offset
+        self.hex_offset = hex_offset
+        self.params = list()
+
+
+class DecompiledParam:
+    '''
+    AST node of the fixed size param. text is None for the param of unknown type.
+    '''
+    __slots__ = ('type_name', 'data', 'text')
+
+    def __init__(self, type_name, data, text):
+        self.type_name = type_name
+        self.data = data
+        self.text = text
+
+
+DECOMPILE_UNKNOWN_TOKEN_TEXT = '/*UnknownToken*/'
+DECOMPILE_PARAMS_DELIMITER = ', '
+DECOMPILE_STATEMENTS_DELIMITER = '\r\n\r\n'
+DECOMPILE_OFFSETS_TEXT_TEMPLATE = '[#Mem Offset: ({})][#Hex Offset: ({})]\r\n'
+
+
+def decompile__render_token_header(token_node, labels_dict, text_only, parts):
+    '''
+    :return: False for the unknown token (it has no params and no brackets)
+    '''
+    token_info = token_node.token
+    if token_info is None:
+        parts.append(DECOMPILE_UNKNOWN_TOKEN_TEXT)
+        return False
+
+    if not text_only:
+        parts.append('[({}):({})]'.format(bytes__to__hex_string(struct.pack('<H', token_node.memory_offset)),
+                                          bytes__to__hex_string(token_info.code)))
+    label_text = decompile__get_current_label_text(labels_dict, token_node.memory_offset)
+    if label_text is not None:
+        parts.append(label_text)
+    parts.append('{}('.format(token_info.name))
+    return True
+
+
+def decompile__render_token(token_node, labels_dict, text_only, parts, spacing=0):
+    '''
+    Renders token's AST node into the list of text parts. Uses an explicit stack instead of recursion, so deeply
+    nested expressions are not limited by the interpreter's recursion limit.
+    :param text_only: False - annotated view ("[(mem offset):(token code)]Token({Type}(param))"); True - "text only"
+        view
+    :param parts: list() of str()
+    '''
+    if not decompile__render_token_header(token_node, labels_dict, text_only, parts):
+        return
+
+    # [token_node, next param index, spacing]
+    stack = [[token_node, 0, spacing]]
+    while stack:
+        frame = stack[-1]
+        token_node, param_index, spacing = frame
+        params = token_node.params
+        if param_index < len(params):
+            frame[1] = param_index + 1
+            if param_index > 0:
+                parts.append(DECOMPILE_PARAMS_DELIMITER)
+            param = params[param_index]
+            subspacing = spacing + 4
+            if type(param) is DecompiledToken:
+                parts.append('\r\n' + ' ' * subspacing)
+                if decompile__render_token_header(param, labels_dict, text_only, parts):
+                    stack.append([param, 0, subspacing])
+            elif param.text is None:
+                parts.append('/*UnknownParamType*/{{{}}}'.format(param.type_name))
+            elif text_only:
+                parts.append('\r\n{}({})'.format(' ' * subspacing, param.text))
+            else:
+                parts.append('\r\n{}{{{}}}({})'.format(' ' * subspacing, param.type_name, param.text))
+        else:
+            if params:
+                parts.append('\r\n' + ' ' * spacing)
+            parts.append(')')
+            stack.pop()
+
+
+def decompile__render_token_text(token_node, labels_dict, text_only=False):
+    parts = list()
+    decompile__render_token(token_node, labels_dict, text_only, parts)
+    return ''.join(parts)
+
+
+class DecompiledFunction:
+    '''
+    Result of the decompile_function(): list of top level tokens (statements) with their end offsets. Text views are
+    rendered on request.
+    '''
+    def __init__(self, labels_dict):
+        self.labels_dict = labels_dict
+        self.statements = list()
+        self.statements_end_offsets = list()
+        self.is_ok = False
+        self.number_of_found_tokens = 0
+        self.memory_offset = 0
+        self.hex_offset = 0
+
+    def iter_text(self):
+        '''
+        Generator of the annotated view: yields statement sized chunks.
+        '''
+        yield DECOMPILE_OFFSETS_TEXT_TEMPLATE.format(bytes__to__hex_string(short_to_bytes(0)),
+                                                     bytes__to__hex_string(short_to_bytes(0)))
+        for statement, end_offsets in zip(self.statements, self.statements_end_offsets):
+            parts = list()
+            decompile__render_token(statement, self.labels_dict, False, parts)
+            parts.append(DECOMPILE_STATEMENTS_DELIMITER)
+            parts.append(DECOMPILE_OFFSETS_TEXT_TEMPLATE.format(bytes__to__hex_string(short_to_bytes(end_offsets[0])),
+                                                                bytes__to__hex_string(short_to_bytes(end_offsets[1]))))
+            yield ''.join(parts)
+
+    def iter_text_only(self):
+        '''
+        Generator of the "text only" view: yields statement sized chunks.
+        '''
+        for statement in self.statements:
+            parts = list()
+            decompile__render_token(statement, self.labels_dict, True, parts)
+            parts.append(DECOMPILE_STATEMENTS_DELIMITER)
+            yield ''.join(parts)
+
+    def render_text(self):
+        return ''.join(self.iter_text())
+
+    def render_text_only(self):
+        return ''.join(self.iter_text_only())
+
+
+def decompile__find_null_terminator(input_view, hex_offset):
+    '''
+    :param input_view: memoryview() of the whole function's bytecode
+    :param hex_offset: search start position
+    :return: position of the b'\x00' or -1
+    '''
+    return input_view.obj.find(b'\x00', hex_offset)
+
+
+def decompile__format_name_ref(value, param_data, decompile_context):
+    '''
+    Formatters of the decoded params. All of them have the same signature: text of the param is returned.
+    :param decompile_context: DecompileContext()
+    '''
+    result = decompile_context.tables.names_table__name_by_id.get(value[:4])
+    if result is None:
+        result = bytes__to__hex_string(param_data)
+    elif ' ' in result:
+        result = decompile_put_text_into_brackets(result)
+    return result
+
+
+def decompile__format_obj_ref(value, param_data, decompile_context):
+    result = decompile_context.tables.names__name_by_id.get(value)
+    if result is None:
+        result = bytes__to__hex_string(param_data)
+    elif ' ' in result:
+        result = decompile_put_text_into_brackets(result)
+    return result
+
+
+def decompile__format_number(value, param_data, decompile_context):
+    return ''.join(['"', str(value), '"'])
+
+
+def decompile__format_mem_off(value, param_data, decompile_context):
+    return decompile__replace_mem_offset_by_label_text(decompile_context.labels_dict, value,
+                                                       decompile_context.labels_id_generator)
+
+
+def decompile__format_hex(value, param_data, decompile_context):
+    return bytes__to__hex_string(param_data)
+
+
+# param type name: (struct format, formatter). Fixed size types which are not listed here are decoded as raw bytes
+# and shown as hex.
+DECOMPILE_PARAM_DECODER_BY_TYPE_NAME = {
+    'NameRef': ('s', decompile__format_name_ref),
+    'ObjRef': ('s', decompile__format_obj_ref),
+    'ObjRef_class': ('s', decompile__format_obj_ref),
+    'ObjRef_member': ('s', decompile__format_obj_ref),
+    'ObjRef_struct': ('s', decompile__format_obj_ref),
+    'RetValRef': ('s', decompile__format_obj_ref),
+    'Byte': ('B', decompile__format_number),
+    'Short': ('h', decompile__format_number),
+    'Int32': ('i', decompile__format_number),
+    'Float32': ('f', decompile__format_number),
+    'MemOff': ('H', decompile__format_mem_off),
+}
+
+
+class TokenParamsRun:
+    '''
+    Consecutive fixed size params of the token: the whole run is decoded by a single prebuilt struct.Struct().
+    param_bounds: ((begin, end), ...) of each param inside of the run's data
+    is_raw: (bool, ...) - param is decoded as raw bytes ('s' format)
+    '''
+    __slots__ = ('params_qnt', 'type_names', 'struct', 'formatters', 'param_bounds', 'is_raw', 'hex_size',
+                 'memory_size')
+
+    def __init__(self, params_types_info):
+        self.params_qnt = len(params_types_info)
+        self.type_names = tuple(type_info.name for type_info in params_types_info)
+
+        struct_format = ['<']
+        formatters = list()
+        param_bounds = list()
+        is_raw = list()
+        hex_size = 0
+        memory_size = 0
+        for type_info in params_types_info:
+            format_char, formatter = DECOMPILE_PARAM_DECODER_BY_TYPE_NAME.get(type_info.name,
+                                                                              ('s', decompile__format_hex))
+            if 's' == format_char:
+                format_char = '{}s'.format(type_info.size_type)
+            elif struct.calcsize('<' + format_char) != type_info.size_type:
+                format_char = '{}s'.format(type_info.size_type)
+                formatter = decompile__format_hex
+            struct_format.append(format_char)
+            formatters.append(formatter)
+            is_raw.append(format_char.endswith('s'))
+            param_bounds.append((hex_size, hex_size + type_info.size_type))
+            hex_size += type_info.size_type
+            if type_info.mem_size_type == TOKEN_TYPES.TOKENTYPE_MEMORY_SIZE_TYPE__SAME_AS_HEX_SIZE:
+                memory_size += type_info.size_type
+            else:
+                memory_size += type_info.mem_size_type
+
+        self.struct = struct.Struct(''.join(struct_format))
+        self.formatters = tuple(formatters)
+        self.param_bounds = tuple(param_bounds)
+        self.is_raw = tuple(is_raw)
+        self.hex_size = hex_size
+        self.memory_size = memory_size
+
+
+def decompile__build_decode_runs(token_info, token_types):
+    '''
+    :return: tuple() with an item for each token's param: TokenParamsRun() which starts at this param or None
+    '''
+    runs = [None] * len(token_info.params)
+    run_begin = None
+    run_types_info = list()
+    for param_index, param_type in enumerate(list(token_info.params) + [None]):
+        type_info = None
+        if param_type is not None:
+            type_info = token_types.type_info_by_number[param_type]
+        if (type_info is not None) and (token_types.TOKENTYPE_TYPE__JUST_SIZE == type_info.type) and \
+                (type_info.size_type > 0):
+            if run_begin is None:
+                run_begin = param_index
+            run_types_info.append(type_info)
+        else:
+            if run_begin is not None:
+                runs[run_begin] = TokenParamsRun(run_types_info)
+            run_begin = None
+            run_types_info = list()
+    return tuple(runs)
+
+for token in US_CODE_TABLE__ALL_TOKENS.tokens:
+    token.decode_runs = decompile__build_decode_runs(token, TOKEN_TYPES)
+
+# fixed size param type number: TokenParamsRun() of this single param (for the params of the truncated runs)
+DECOMPILE_SINGLE_PARAM_RUN_BY_TYPE_NUMBER = dict()
+for type_number, type_info in TOKEN_TYPES.type_info_by_number.items():
+    if (TOKEN_TYPES.TOKENTYPE_TYPE__JUST_SIZE == type_info.type) and (type_info.size_type > 0):
+        DECOMPILE_SINGLE_PARAM_RUN_BY_TYPE_NUMBER[type_number] = TokenParamsRun((type_info,))
+
+
+def decompile__format_single_param(params_run, param_data, decompile_context):
+    '''
+    Decodes the param by the same struct format and formatter as the whole run does.
+    :param params_run: TokenParamsRun() of the single param
+    :param param_data: bytes(); may be shorter than the param at the end of the input data: raw param is formatted
+        as is, while the number can't be decoded (struct.error is raised)
+    :return: text of the param
+    '''
+    if params_run.is_raw[0] and (len(param_data) != params_run.hex_size):
+        value = param_data
+    else:
+        value = params_run.struct.unpack(param_data)[0]
+    return params_run.formatters[0](value, param_data, decompile_context)
+
+
+class DecompileFrame:
+    '''
+    State of the token which params are being decoded by the decompile_token().
+    '''
+    __slots__ = ('token_node', 'param_index', 'param_type_name', 'in_params_list', 'params_list_is_finished',
+                 'hex_offset', 'spacing')
+
+    def __init__(self, token_node, hex_offset, spacing):
+        self.token_node = token_node
+        self.param_index = 0
+        self.param_type_name = None
+        self.in_params_list = False
+        self.params_list_is_finished = False
+        self.hex_offset = hex_offset
+        self.spacing = spacing
+
+
+def decompile_token(input_view, decompile_context, spacing=None, d_print=None, memory_offset=None, hex_offset=None):
+    '''
+    Decodes single token (with all it's params) into the DecompiledToken() without copying of the input data:
+    hex_offset is the cursor inside input_view. Jump targets are registered in decompile_context.labels_dict.
+    Nested expressions are decoded with an explicit stack of DecompileFrame() instead of recursion.
+    :param input_view: memoryview() of the whole function's bytecode
+    :param decompile_context: DecompileContext()
+    :param hex_offset: cursor position inside input_view
+    :return: (is_ok, token_node, number_of_found_tokens, memory_offset, hex_offset)
+    '''
     spacing = spacing or 0
     memory_offset = memory_offset or 0
     hex_offset = hex_offset or 0
-    initial_memory_offset = copy.copy(memory_offset)
     d_print = d_print or DebugPrinter()
-    spacing_string = ' ' * spacing
-    current_token_spacing_string = '\r\n' + ' ' * spacing
-    subspacing = spacing + 4
-    subtokens_spacing_string = '\r\n' + ' ' * subspacing
-    d_print._spacing_string = spacing_string
-
-    if d_print.is_print: d_print('DECOMPILE DATA: {}'.format(bytes__to__hex_string(input_data)))
-    unknown_text = '/*UnknownToken*/'
-    params_delimiter = ', '
-    number_of_found_tokens = 0
-    result = (False, b'', b'', unknown_text, unknown_text, number_of_found_tokens, memory_offset, hex_offset)
-    printable_result = (False, '', '', unknown_text, unknown_text,
-                        number_of_found_tokens, memory_offset, hex_offset)
-
-    working = copy.copy(input_data)
-    current = b''
-    token_found = False
-    token_num = working[:2]
-    if token_num in US_CODE_TABLE__ALL_TOKENS.token_by_code:
-        token_found = True
-    else:
-        token_num = working[:1]
-        if token_num in US_CODE_TABLE__ALL_TOKENS.token_by_code:
-            token_found = True
+    labels_dict = decompile_context.labels_dict
 
-    token_text = ''
-    token_text_only = ''
+    input_view_len = len(input_view)
+    number_of_found_tokens = 0
     last_decompile_result = True
-    if token_found:
-        token_num_len = len(token_num)
-        working = working[token_num_len:]
-        hex_offset += token_num_len
-        memory_offset += token_num_len
-        current += token_num
-        if d_print.is_print: d_print('TOKEN ID: {}; CURRENT: {}; WORKING: {}'.format(
-            token_num,
-            bytes__to__hex_string(current),
-            bytes__to__hex_string(working)))
-
-        token_info = US_CODE_TABLE__ALL_TOKENS.token_by_code[token_num]
-        if d_print.is_print: d_print('TOKEN INFO: {}'.format(str(token_info)))
-        token_name = token_info.name
-        token_params = token_info.params
-        token_termination = token_info.termination
-        token_hex_representation = bytes__to__hex_string(token_info.code)
-        if d_print.is_print: d_print('TOKEN PARAMS: {}'.format(token_params))
-        if d_print.is_print: d_print('TOKEN TERMINATION: {}'.format(token_termination))
-        
-        token_params_text = ''
-        token_params_text_only = ''
-        for token_param_type in token_params:
-            if d_print.is_print: d_print('<<token_param_type: {}'.format(token_param_type))
-            token_param_type_info = TOKEN_TYPES.type_info_by_number[token_param_type]
-            if d_print.is_print: d_print('<<token_param_type_info: {}'.format(str(token_param_type_info)))
-            token_param_type_type = token_param_type_info.type
-            token_param_type_type_name = token_param_type_info.name
-            token_param_type_size = token_param_type_info.size_type
-            token_param_type_mem_size = token_param_type_info.mem_size_type
-            if token_param_type_type is not None:
-                if TOKEN_TYPES.TOKENTYPE_TYPE__HAS_TYPE == token_param_type_type:
-                    decompile_result = decompile_token(working, labels_dict, labels_id_generator, subspacing, d_print, memory_offset,
-                                                       hex_offset)
-                    last_decompile_result = decompile_result[0]
-                    current += decompile_result[1]
-                    working = decompile_result[2]
-                    token_params_text += subtokens_spacing_string + decompile_result[3] + params_delimiter
-                    token_params_text_only += subtokens_spacing_string + decompile_result[4] + params_delimiter
-                    number_of_found_tokens += decompile_result[5]
-                    memory_offset = decompile_result[6]
-                    hex_offset = decompile_result[7]
-                elif TOKEN_TYPES.TOKENTYPE_TYPE__JUST_SIZE == token_param_type_type:
-                    last_decompile_result = True
-                    if TOKEN_TYPES.TOKENTYPE_SIZE_TYPE__NULLTERMINATED == token_param_type_size:
-                        zero_offset = working.find(b'\x00')
-                        if zero_offset == -1:
-                            last_decompile_result = False
-                            token_param_type_size = 0
-                        else:
-                            token_param_type_size = zero_offset + 1
-                    if last_decompile_result:
-                        param_data = working[:token_param_type_size]
-                        hex_offset += token_param_type_size
-                        if token_param_type_mem_size == TOKEN_TYPES.TOKENTYPE_MEMORY_SIZE_TYPE__SAME_AS_HEX_SIZE:
-                            memory_offset += token_param_type_size
-                        else:
-                            memory_offset += token_param_type_mem_size
-                        current += param_data
-                        working = working[token_param_type_size:]
-                        param_data_hex_string = bytes__to__hex_string(param_data)
-                        if token_param_type_type_name in {'NameRef'}:
-                            sub_bin_id = param_data[:4]
-                            if sub_bin_id in UPK__NAMES_TABLE__NAME_BY_ID:
-                                param_data_hex_string = UPK__NAMES_TABLE__NAME_BY_ID[sub_bin_id]
-                                if ' ' in param_data_hex_string:
-                                    param_data_hex_string = decompile_put_text_into_brackets(param_data_hex_string)
-                        elif token_param_type_type_name in {'ObjRef', 'ObjRef_class', 'ObjRef_member', 'ObjRef_struct',
-                                                            'RetValRef'}:
-                            if param_data in UPK__NAMES__NAME_BY_ID:
-                                param_data_hex_string = UPK__NAMES__NAME_BY_ID[param_data]
-                                if ' ' in param_data_hex_string:
-                                    param_data_hex_string = decompile_put_text_into_brackets(param_data_hex_string)
-                        elif token_param_type_type_name in {'NullTerminatedString'}:
-                            try:
-                                string_data = param_data[:-1].decode()  # may raise
-                                string_data = decompile_put_text_into_brackets(string_data)
-                                param_data_hex_string = string_data
-                            except UnicodeError:
-                                pass  # param_data_hex_string is unchanged
-                        elif token_param_type_type_name in {'Byte'}:
-                            param_data_hex_string = ''.join(['"', str(bytes_to_byte(param_data)), '"'])
-                        elif token_param_type_type_name in {'Short'}:
-                            param_data_hex_string = ''.join(['"', str(bytes_to_short(param_data)), '"'])
-                        elif token_param_type_type_name in {'Int32'}:
-                            param_data_hex_string = ''.join(['"', str(bytes_to_int(param_data)), '"'])
-                        elif token_param_type_type_name in {'Float32'}:
-                            param_data_hex_string = ''.join(['"', str(bytes_to_float(param_data)), '"'])
-                        elif token_param_type_type_name in {'MemOff'}:
-                            param_data_hex_string = decompile__replace_mem_offset_by_label_text(
-                                    labels_dict, struct.unpack('<H', param_data)[0], labels_id_generator)
-                        token_params_text += subtokens_spacing_string + '{{{}}}({})'.format(token_param_type_type_name, param_data_hex_string) + params_delimiter
-                        token_params_text_only += subtokens_spacing_string + '({})'.format(param_data_hex_string) + params_delimiter
-                        number_of_found_tokens += 1
-                elif TOKEN_TYPES.TOKENTYPE_TYPE__TOKENS_LIST_WITH_TYPES == token_param_type_type:
-                    continue_processing = True
-                    while continue_processing:
-                        if working.startswith(token_termination):
-                            continue_processing = False
-                        decompile_result = decompile_token(working, labels_dict, labels_id_generator, subspacing, d_print, memory_offset,
-                                                           hex_offset)
-                        last_decompile_result = decompile_result[0]
-                        current += decompile_result[1]
-                        working = decompile_result[2]
-                        token_params_text += subtokens_spacing_string + decompile_result[3] + params_delimiter
-                        token_params_text_only += subtokens_spacing_string + decompile_result[4] + params_delimiter
-                        number_of_found_tokens += decompile_result[5]
-                        memory_offset = decompile_result[6]
-                        hex_offset = decompile_result[7]
-                        if not last_decompile_result:
-                            break
-                pass
+    root_token_node = None
+    stack = list()
+    need_new_token = True
+    while True:
+        if need_new_token:
+            need_new_token = False
+            token_spacing = spacing + 4 * len(stack)
+            d_print._spacing_string = ' ' * token_spacing
+            if d_print.is_print: d_print('DECOMPILE DATA: {}'.format(bytes__to__hex_string(input_view[hex_offset:])))
+            token_info = US_CODE_TABLE__DISPATCH.find_token(input_view, hex_offset)
+            token_node = DecompiledToken(token_info, memory_offset, hex_offset)
+            if stack:
+                stack[-1].token_node.params.append(token_node)
             else:
-                unknown_param_type_text = '/*UnknownParamType*/{{{}}}'.format(token_param_type_type_name)
-                token_params_text += unknown_param_type_text + params_delimiter
-                token_params_text_only += unknown_param_type_text + params_delimiter
+                root_token_node = token_node
+
+            if token_info is None:
                 last_decompile_result = False
-                d_print('UNKNOWN PARAM TYPE: "{}" from "[{}]{}"'.format(
-                    token_param_type_type_name, 
-                    token_hex_representation, 
-                    token_name), 
-                        True)
-            if not last_decompile_result:
-                d_print('WRONG PARAM: "{}" from "[{}]{}"'.format(
-                    token_param_type_type_name, 
-                    token_hex_representation, 
-                    token_name), 
-                        True)
-            if not last_decompile_result:
-                break
-            if d_print.is_print: d_print('== token_params_text: {}'.format(token_params_text))
-            if d_print.is_print: d_print('== current: {}'.format(bytes__to__hex_string(current)))
-            if d_print.is_print: d_print('== working: {}'.format(bytes__to__hex_string(working)))
-            if d_print.is_print: d_print('')
+                if d_print.is_print: d_print('SUB RESULT: {}'.format(
+                        (False, '', '', DECOMPILE_UNKNOWN_TOKEN_TEXT, DECOMPILE_UNKNOWN_TOKEN_TEXT, 0, memory_offset,
+                         hex_offset)))
+            else:
+                token_num_len = len(token_info.code)
+                stack.append(DecompileFrame(token_node, hex_offset, token_spacing))
+                hex_offset += token_num_len
+                memory_offset += token_num_len
+                if d_print.is_print: d_print('TOKEN ID: {}; CURRENT: {}; WORKING: {}'.format(
+                    token_info.code,
+                    bytes__to__hex_string(token_info.code),
+                    bytes__to__hex_string(input_view[hex_offset:])))
+                if d_print.is_print: d_print('TOKEN INFO: {}'.format(str(token_info)))
+                if d_print.is_print: d_print('TOKEN PARAMS: {}'.format(token_info.params))
+                if d_print.is_print: d_print('TOKEN TERMINATION: {}'.format(token_info.termination))
+
+        if not stack:
+            break
+
+        frame = stack[-1]
+        token_node = frame.token_node
+        token_info = token_node.token
+        d_print._spacing_string = ' ' * frame.spacing
 
         if not last_decompile_result:
-            if d_print.is_print: d_print('== token_params_text: {}'.format(token_params_text))
-            if d_print.is_print: d_print('== current: {}'.format(bytes__to__hex_string(current)))
-            if d_print.is_print: d_print('== working: {}'.format(bytes__to__hex_string(working)))
-            if d_print.is_print: d_print('')
-
-        if token_params_text.endswith(params_delimiter):
-            token_params_text = token_params_text[:-len(params_delimiter)]
-        
-        if token_params_text_only.endswith(params_delimiter):
-            token_params_text_only = token_params_text_only[:-len(params_delimiter)]
-
-        # token_text = '[{}]{}({})'.format(token_hex_representation, token_info.name, token_params_text)
-        close_bracket_spacing = current_token_spacing_string
-        if len(token_params_text) == 0:
-            close_bracket_spacing = ''
-        label_text = decompile__get_current_label_text(labels_dict, initial_memory_offset)
-        if label_text is None:
-            token_text = '[({}):({})]{}({}{})'.format(
-                    bytes__to__hex_string(struct.pack('<H', initial_memory_offset)),
-                    token_hex_representation,
-                    token_info.name,
-                    token_params_text,
-                    close_bracket_spacing)
-            token_text_only = '{}({}{})'.format(token_info.name, token_params_text_only, close_bracket_spacing)
-        else:
-            token_text = '[({}):({})]{}{}({}{})'.format(
-                    bytes__to__hex_string(struct.pack('<H', initial_memory_offset)),
-                    token_hex_representation,
-                    label_text,
-                    token_info.name,
-                    token_params_text,
-                    close_bracket_spacing)
-            token_text_only = '{}{}({}{})'.format(label_text, token_info.name, token_params_text_only,
-                                                  close_bracket_spacing)
-
-        result = (last_decompile_result, current, working, token_text, token_text_only, number_of_found_tokens,
-                  memory_offset, hex_offset)
-        if d_print.is_print:
-            printable_result = (
-                last_decompile_result,
-                bytes__to__hex_string(current),
-                bytes__to__hex_string(working),
-                token_text,
-                token_text_only,
-                number_of_found_tokens,
-                memory_offset, hex_offset)
-
-    if d_print.is_print: d_print('SUB RESULT: {}'.format(printable_result))
+            # the error is propagated up to the root token
+            d_print('WRONG PARAM: "{}" from "[{}]{}"'.format(
+                frame.param_type_name,
+                bytes__to__hex_string(token_info.code),
+                token_info.name),
+                    True)
+            if d_print.is_print: d_print('== token_text: {}'.format(
+                    decompile__render_token_text(token_node, labels_dict)))
+            stack.pop()
+            continue
+
+        if frame.in_params_list:
+            if frame.params_list_is_finished:
+                frame.in_params_list = False
+            else:
+                token_termination = token_info.termination
+                if input_view[hex_offset:hex_offset + len(token_termination)] == token_termination:
+                    frame.params_list_is_finished = True
+                need_new_token = True
+                continue
+
+        token_params = token_info.params
+        if frame.param_index >= len(token_params):
+            if d_print.is_print: d_print('SUB RESULT: {}'.format((
+                    True,
+                    bytes__to__hex_string(input_view[frame.hex_offset:hex_offset]),
+                    bytes__to__hex_string(input_view[hex_offset:]),
+                    decompile__render_token_text(token_node, labels_dict),
+                    decompile__render_token_text(token_node, labels_dict, True),
+                    number_of_found_tokens,
+                    memory_offset, hex_offset)))
+            stack.pop()
+            continue
+
+        params_run = token_info.decode_runs[frame.param_index]
+        if (params_run is not None) and (hex_offset + params_run.hex_size <= input_view_len):
+            # whole run of the fixed size params at once. Truncated runs are decoded param by param below.
+            run_hex_offset = hex_offset
+            run_data = input_view[hex_offset:hex_offset + params_run.hex_size].tobytes()
+            for type_name, param_bounds, formatter, value in zip(params_run.type_names, params_run.param_bounds,
+                                                                 params_run.formatters,
+                                                                 params_run.struct.unpack(run_data)):
+                param_data = run_data[param_bounds[0]:param_bounds[1]]
+                token_node.params.append(DecompiledParam(type_name, param_data,
+                                                         formatter(value, param_data, decompile_context)))
+                if d_print.is_print:
+                    token_param_type = token_params[frame.param_index]
+                    d_print('<<token_param_type: {}'.format(token_param_type))
+                    d_print('<<token_param_type_info: {}'.format(
+                        str(TOKEN_TYPES.type_info_by_number[token_param_type])))
+                    d_print('== token_text: {}'.format(decompile__render_token_text(token_node, labels_dict)))
+                    d_print('== current: {}'.format(
+                        bytes__to__hex_string(input_view[frame.hex_offset:run_hex_offset + param_bounds[1]])))
+                    d_print('== working: {}'.format(
+                        bytes__to__hex_string(input_view[run_hex_offset + param_bounds[1]:])))
+                    d_print('')
+                frame.param_index += 1
+            frame.param_type_name = params_run.type_names[-1]
+            number_of_found_tokens += params_run.params_qnt
+            hex_offset += params_run.hex_size
+            memory_offset += params_run.memory_size
+            continue
+
+        token_param_type = token_params[frame.param_index]
+        frame.param_index += 1
+        if d_print.is_print: d_print('<<token_param_type: {}'.format(token_param_type))
+        token_param_type_info = TOKEN_TYPES.type_info_by_number[token_param_type]
+        if d_print.is_print: d_print('<<token_param_type_info: {}'.format(str(token_param_type_info)))
+        token_param_type_type = token_param_type_info.type
+        token_param_type_type_name = token_param_type_info.name
+        token_param_type_size = token_param_type_info.size_type
+        token_param_type_mem_size = token_param_type_info.mem_size_type
+        frame.param_type_name = token_param_type_type_name
+        if token_param_type_type is None:
+            token_node.params.append(DecompiledParam(token_param_type_type_name, None, None))
+            last_decompile_result = False
+            d_print('UNKNOWN PARAM TYPE: "{}" from "[{}]{}"'.format(
+                token_param_type_type_name,
+                bytes__to__hex_string(token_info.code),
+                token_info.name),
+                    True)
+        elif TOKEN_TYPES.TOKENTYPE_TYPE__HAS_TYPE == token_param_type_type:
+            need_new_token = True
+        elif TOKEN_TYPES.TOKENTYPE_TYPE__TOKENS_LIST_WITH_TYPES == token_param_type_type:
+            frame.in_params_list = True
+            frame.params_list_is_finished = False
+        elif TOKEN_TYPES.TOKENTYPE_TYPE__JUST_SIZE == token_param_type_type:
+            if TOKEN_TYPES.TOKENTYPE_SIZE_TYPE__NULLTERMINATED == token_param_type_size:
+                zero_offset = decompile__find_null_terminator(input_view, hex_offset)
+                if zero_offset == -1:
+                    last_decompile_result = False
+                    token_param_type_size = 0
+                else:
+                    token_param_type_size = zero_offset - hex_offset + 1
+            if last_decompile_result:
+                param_data = input_view[hex_offset:hex_offset + token_param_type_size].tobytes()
+                hex_offset += token_param_type_size
+                if token_param_type_mem_size == TOKEN_TYPES.TOKENTYPE_MEMORY_SIZE_TYPE__SAME_AS_HEX_SIZE:
+                    memory_offset += token_param_type_size
+                else:
+                    memory_offset += token_param_type_mem_size
+                params_run = DECOMPILE_SINGLE_PARAM_RUN_BY_TYPE_NUMBER.get(token_param_type)
+                if params_run is not None:
+                    param_data_hex_string = decompile__format_single_param(params_run, param_data,
+                                                                           decompile_context)
+                else:
+                    param_data_hex_string = bytes__to__hex_string(param_data)
+                    if token_param_type_type_name in {'NullTerminatedString'}:
+                        try:
+                            string_data = param_data[:-1].decode()  # may raise
+                            param_data_hex_string = decompile_put_text_into_brackets(string_data)
+                        except UnicodeError:
+                            pass  # param_data_hex_string is unchanged
+                token_node.params.append(DecompiledParam(token_param_type_type_name, param_data,
+                                                         param_data_hex_string))
+                number_of_found_tokens += 1
+                if d_print.is_print: d_print('== token_text: {}'.format(
+                        decompile__render_token_text(token_node, labels_dict)))
+                if d_print.is_print: d_print('== current: {}'.format(
+                        bytes__to__hex_string(input_view[frame.hex_offset:hex_offset])))
+                if d_print.is_print: d_print('== working: {}'.format(bytes__to__hex_string(input_view[hex_offset:])))
+                if d_print.is_print: d_print('')
+
+    result = (last_decompile_result, root_token_node, number_of_found_tokens, memory_offset, hex_offset)
     return result
 
 
-def full_decompile(input_data, d_print=None, labels_dict=None, labels_id_generator=None, first_pass=True):
+def decompile_function(input_data, d_print=None, labels_dict=None, labels_id_generator=None, package_context=None):
+    '''
+    Single pass decompilation into the AST: jump targets are collected into labels_dict while decoding, and label
+    texts are placed before the tokens when text views are rendered.
+    :param input_data: bytes()
+    :param package_context: UpkPackageContext() of the package the function belongs to; None - UPK_PACKAGE_CONTEXT
+    :return: DecompiledFunction()
+    '''
     d_print = d_print or DebugPrinter()
-    labels_dict = labels_dict or dict()
-    labels_id_generator = labels_id_generator or IDGenerator.IDGenerator()
-    result = ('', '')
-    working = copy.copy(input_data)
-    current = b''
-    token_text = ''
-    token_text_only = ''
-    tokens_delimiter = '\r\n\r\n'
+    decompile_context = DecompileContext(package_context, labels_dict, labels_id_generator)
+    labels_dict = decompile_context.labels_dict
+    input_view = memoryview(bytes(input_data))
+    input_data_len = len(input_view)
+    function = DecompiledFunction(labels_dict)
 
     number_of_found_tokens = 0
     memory_offset = 0
     hex_offset = 0
     last_decompile_result = False
-    token_text += '[#Mem Offset: ({})]'.format(bytes__to__hex_string(short_to_bytes(memory_offset)))
-    token_text += '[#Hex Offset: ({})]\r\n'.format(bytes__to__hex_string(short_to_bytes(hex_offset)))
 
     need_to_process = True
     while need_to_process:
-        decompile_result = decompile_token(working, labels_dict, labels_id_generator, 0, d_print, memory_offset, hex_offset)
-        working = decompile_result[2]
+        decompile_result = decompile_token(input_view, decompile_context, 0, d_print, memory_offset, hex_offset)
         last_decompile_result = decompile_result[0]
-        token_text += decompile_result[3] + tokens_delimiter
-        token_text_only += decompile_result[4] + tokens_delimiter
-        number_of_found_tokens += decompile_result[5]
-        memory_offset = decompile_result[6]
-        hex_offset = decompile_result[7]
-        token_text += '[#Mem Offset: ({})]'.format(bytes__to__hex_string(short_to_bytes(memory_offset)))
-        token_text += '[#Hex Offset: ({})]\r\n'.format(bytes__to__hex_string(short_to_bytes(hex_offset)))
-        need_to_process = decompile_result[0] and (len(working) > 0)
-        if not need_to_process and (len(working) > 0):
-            print('ERROR IN [{}] FROM [{}]'.format(bytes__to__hex_string(working), bytes__to__hex_string(input_data)))
-
-    result = (last_decompile_result, token_text, token_text_only, number_of_found_tokens, memory_offset, hex_offset)
-    if first_pass:
-        result = full_decompile(input_data, d_print, labels_dict, labels_id_generator=None, first_pass=False)
-
+        number_of_found_tokens += decompile_result[2]
+        memory_offset = decompile_result[3]
+        hex_offset = decompile_result[4]
+        function.statements.append(decompile_result[1])
+        function.statements_end_offsets.append((memory_offset, hex_offset))
+        need_to_process = decompile_result[0] and (hex_offset < input_data_len)
+        if not need_to_process and (hex_offset < input_data_len):
+            print('ERROR IN [{}] FROM [{}]'.format(bytes__to__hex_string(input_view[hex_offset:]),
+                                                   bytes__to__hex_string(input_view)))
+
+    function.is_ok = last_decompile_result
+    function.number_of_found_tokens = number_of_found_tokens
+    function.memory_offset = memory_offset
+    function.hex_offset = hex_offset
+    return function
+
+
+def full_decompile(input_data, d_print=None, labels_dict=None, labels_id_generator=None, package_context=None):
+    '''
+    :param input_data: bytes()
+    :param package_context: see decompile_function()
+    :return: (is_ok, token_text, token_text_only, number_of_found_tokens, memory_offset, hex_offset)
+    '''
+    function = decompile_function(input_data, d_print, labels_dict, labels_id_generator, package_context)
+    result = (function.is_ok, function.render_text(), function.render_text_only(), function.number_of_found_tokens,
+              function.memory_offset, function.hex_offset)
     return result
 
 
+DECOMPILE_OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+def decompile__ucb_file_chunks(function, description_lines=None):
+    '''
+    Generator of the .ucb file content: annotated view inside of the description and then the "text only" view.
+    :param function: DecompiledFunction()
+    :param description_lines: list of lines (like 'OBJECT_NAME=...') to put at the beginning of the description
+    '''
+    yield DESCRIPTION_BEGIN_WORD + '\r\n' + '\r\n'
+    if description_lines:
+        yield '\r\n'.join(description_lines) + '\r\n' + '\r\n'
+    for chunk in function.iter_text():
+        yield chunk
+    yield DESCRIPTION_END_WORD + '\r\n' + '\r\n\r\n'
+    for chunk in function.iter_text_only():
+        yield chunk
+
+
+def write_decompiled_ucb_file(file_name, function, buffer_size=DECOMPILE_OUTPUT_BUFFER_SIZE, description_lines=None):
+    '''
+    Writes .ucb file statement by statement through the buffered writer, so the whole text is never built in memory.
+    :param function: DecompiledFunction()
+    '''
+    with open(file_name, 'bw', buffering=buffer_size) as file:
+        for chunk in decompile__ucb_file_chunks(function, description_lines):
+            file.write(chunk.encode())
+
+
 def decompile_put_text_into_brackets(string_data):
     if '\\' in string_data:
         string_data = string_data.replace('\\', '\\\\')
@@ -1175,52 +1996,76 @@ def decompile_put_text_into_brackets(string_data):
     return string_data
 
 
-def compile__get_text_token(data, id_gen=None):
-    result = None
-    id_gen = id_gen or IDGenerator.IDGenerator()
-
-    l_brack = data.find('\"')
-    if l_brack >= 0:
-        orig_l_part = data[:l_brack]
-        orig_m_part = data[l_brack + 1:]
-        orig_r_part = None
-
-        start = 0
-        r_brack = orig_m_part.find('\"', start)
-        if r_brack == -1: raise CompileQuotesExceptionMissedRQuote(l_brack)
-        while (((r_brack - 1) >= 0) and (orig_m_part[r_brack - 1] == '\\') and
-                   ((r_brack - 2) >= 0) and (orig_m_part[r_brack - 2] != '\\')) or \
-                (((r_brack - 1) >= 0) and (orig_m_part[r_brack - 1] == '\\')):
-            start = r_brack + 1
-            r_brack = orig_m_part.find('\"', start)
-            if r_brack == -1: raise CompileQuotesExceptionMissedRQuote(l_brack)
-        orig_r_part = orig_m_part[r_brack + 1:]
-        orig_m_part = orig_m_part[:r_brack]
-
-        id_m_part = ''.join(['<', str(id_gen.get_new_ID()), '>'])
-        new_data = ''.join([orig_l_part, id_m_part, orig_r_part])
-
-        parced_m_part = copy.copy(orig_m_part)
-        if '\\\\' in parced_m_part:
-            parced_m_part = parced_m_part.replace('\\\\', '\\')
-        if '\\\"' in parced_m_part:
-            parced_m_part = parced_m_part.replace('\\\"', '\"')
-
-        result = (orig_m_part, parced_m_part, id_m_part, new_data, (l_brack, l_brack + r_brack))
-    return result
+COMPILE_TEXT_TOKEN_ESCAPE_REGEX = re.compile(r'\\([\\"])')
+
+
+def compile__unescape_text_token(text_token):
+    '''
+    :param text_token: text token as it is in the source (with quotes): "some \\"text\\""
+    :return: text without quotes and escapes: some "text"
+    '''
+    return COMPILE_TEXT_TOKEN_ESCAPE_REGEX.sub(r'\1', text_token[1:-1])
 
 
-def compile__get_all_text_tokens(data):
-    id_gen = IDGenerator.IDGenerator()
-    text_tokens = dict()
-    another_result = compile__get_text_token(data, id_gen)
-    while another_result is not None:
-        # text_tokens[another_result[2]] = another_result[1]
-        text_tokens[another_result[2]] = ''.join(['"', another_result[0], '"'])
-        data = another_result[3]
-        another_result = compile__get_text_token(data, id_gen)
+_COMPILE_LEXER_WORD_PART = r'(?:[^\s,()"/]+(?:/(?!\*DESCRIPTION_)[^\s,()"/]*)*|/(?!\*DESCRIPTION_)[^\s,()"/]*' \
+                           r'(?:/(?!\*DESCRIPTION_)[^\s,()"/]*)*)'
 
-    result = (data, text_tokens)
+# ',', '(', ')' and whitespace before the token are skipped by the same match; alternatives are tried in this order.
+# Whitespace inside of a word does not split it (like the "''.join(data.split())" did). Text token is kept with it's
+# quotes and escapes.
+COMPILE_LEXER_REGEX = re.compile(r'[\s,()]*(?:' + '|'.join([
+    '(?P<description>{0}[^/]*(?:/(?!{2})[^/]*)*{1})'.format(re.escape(DESCRIPTION_BEGIN_WORD),
+                                                         re.escape(DESCRIPTION_END_WORD),
+                                                         re.escape(DESCRIPTION_END_WORD[1:])),
+    '(?P<description_error>{}|{})'.format(re.escape(DESCRIPTION_BEGIN_WORD), re.escape(DESCRIPTION_END_WORD)),
+    r'(?P<text>"[^"\\]*(?:\\.[^"\\]*)*")',
+    r'(?P<quote>")',
+    r'(?P<word>{0}(?P<word_space>(?:\s+{0})+)?)'.format(_COMPILE_LEXER_WORD_PART),
+]) + ')')
+
+
+def compile__get_tokens(data):
+    '''
+    Single pass lexer of the source code.
+    :param data: source code str()
+    :return: (tokens_list, tokens_positions) - tokens_positions[i] is the position of the tokens_list[i] in the data
+    '''
+    tokens_list = list()
+    tokens_positions = list()
+    glue_position = None  # word after the description is glued to the word before it (if there is only whitespace)
+    previous_match = None
+    for match in COMPILE_LEXER_REGEX.finditer(data):
+        kind = match.lastgroup
+        if 'word' == kind:
+            word = match.group(kind)
+            start = match.start(kind)
+            if match.group('word_space') is not None:
+                word = ''.join(word.split())
+            if (glue_position is not None) and ((glue_position == start) or data[glue_position:start].isspace()):
+                tokens_list[-1] += word
+            else:
+                tokens_list.append(word)
+                tokens_positions.append(start)
+            glue_position = None
+        elif 'description' == kind:
+            start = match.start(kind)
+            if (previous_match is not None) and (previous_match.lastgroup in {'word', 'description'}):
+                previous_end = previous_match.end()
+                if (previous_end == start) or data[previous_end:start].isspace():
+                    if ('word' == previous_match.lastgroup) or (glue_position is not None):
+                        glue_position = match.end()
+        else:
+            glue_position = None
+            if 'text' == kind:
+                tokens_list.append(match.group(kind))
+                tokens_positions.append(match.start(kind))
+            elif 'quote' == kind:
+                raise CompileQuotesExceptionMissedRQuote(match.start(kind))
+            elif 'description_error' == kind:
+                raise IsOK_BlockFailed('ERROR: DESCRIPTION TAGS')
+        previous_match = match
+
+    result = (tokens_list, tokens_positions)
     return result
 
 
@@ -1269,17 +2114,24 @@ COMPILATION_EXCEPTIONS_SET = {
 
 
 class CompileException(Exception):
-    def __init__(self, exception_type, exception, data, str_data):
+    def __init__(self, exception_type, exception, data, str_data, source_position=None, error_source_position=None):
+        '''
+        :param source_position: position (in the source code) of the expression which was compiled, or None
+        :param error_source_position: position (in the source code) of the token where the compiler has stopped, or
+            None
+        '''
         super(CompileException, self).__init__(str(exception))
         self.exception_type = exception_type
         self.exception = exception
         self.data = data
         self.str_data = str_data
+        self.source_position = source_position
+        self.error_source_position = error_source_position
 
 
 def compile__resolve_name_ref(param_name, name_table, need_zeros=False):
     # if '\"' == param_name[0]:
-    #     clean_param_name = compile__get_text_token(param_name)[1]
+    #     clean_param_name = compile__unescape_text_token(param_name)
     #     if clean_param_name in name_table:
     #         param_bytecode = name_table[clean_param_name]
     #         if need_zeros:
@@ -1292,7 +2144,7 @@ def compile__resolve_name_ref(param_name, name_table, need_zeros=False):
     clean_param_name = param_name
     if '\"' == param_name[0]:
         # print('-')
-        clean_param_name = compile__get_text_token(param_name)[1]
+        clean_param_name = compile__unescape_text_token(param_name)
     if clean_param_name in name_table:
         param_bytecode = name_table[clean_param_name]
         if need_zeros:
@@ -1307,31 +2159,219 @@ def compile__resolve_name_ref(param_name, name_table, need_zeros=False):
     return param_bytecode
 
 
-def compile_token(token_list, found_tokens_list, labels_dict, memory_offset, hex_offset, first_pass=False):
-    result = None
+COMPILE_OUTPUT_INITIAL_CAPACITY = 4096
+
+# param type name: struct of the quoted (decimal) value
+COMPILE_NUMBER_STRUCT_BY_TYPE_NAME = {
+    'Byte': struct.Struct('<B'),
+    'Short': struct.Struct('<h'),
+    'Int32': struct.Struct('<i'),
+    'Float32': struct.Struct('<f'),
+}
+COMPILE_MEM_OFF_STRUCT = struct.Struct('<H')
+
+
+class CompileOutput:
+    '''
+    Bytecode being emitted by the compile_token(): single growable bytearray (capacity is doubled when needed).
+    Fixed width values are written in place by the struct.pack_into(), so the size of the output is the hex offset
+    of the next token.
+    '''
+    __slots__ = ('buffer', 'size')
+
+    def __init__(self, capacity=COMPILE_OUTPUT_INITIAL_CAPACITY):
+        self.buffer = bytearray(capacity)
+        self.size = 0
+
+    def reserve(self, data_size):
+        required_capacity = self.size + data_size
+        capacity = len(self.buffer)
+        if required_capacity > capacity:
+            self.buffer.extend(bytes(max(required_capacity, 2 * capacity) - capacity))
+
+    def write(self, data):
+        '''
+        :param data: bytes()
+        :return: size of the written data
+        '''
+        data_size = len(data)
+        self.reserve(data_size)
+        end = self.size + data_size
+        self.buffer[self.size:end] = data
+        self.size = end
+        return data_size
+
+    def pack(self, value_struct, value):
+        '''
+        :param value_struct: struct.Struct(); struct.error is raised before anything is written
+        :return: size of the written data
+        '''
+        data_size = value_struct.size
+        self.reserve(data_size)
+        value_struct.pack_into(self.buffer, self.size, value)
+        self.size += data_size
+        return data_size
+
+    def pack_at(self, value_struct, offset, value):
+        value_struct.pack_into(self.buffer, offset, value)
+
+    def get_bytes(self):
+        return bytes(memoryview(self.buffer)[:self.size])
+
 
-    context = IsOK_ContextHolder('UE3 Bytecode Compiler - Token', None, ResultType(CriteriaType.optional, set()),
-                                 False, True)
+def compile__encode_name_ref(param_name, output, parser, compile_context, token_name):
+    '''
+    Encoders of the token's params. All of them have the same signature: the param is written to the output (a
+    CompileOutput()), the param's text (as it must be stored in the list of the found tokens) is returned.
+    :param compile_context: CompileContext()
+    '''
+    output.write(compile__resolve_name_ref(param_name, compile_context.tables.names_table__id_by_name, True))
+    return param_name
+
+
+def compile__encode_obj_ref(param_name, output, parser, compile_context, token_name):
+    output.write(compile__resolve_name_ref(param_name, compile_context.tables.names__id_by_name, False))
+    return param_name
+
+
+def compile__encode_mem_off(param_name, output, parser, compile_context, token_name):
+    if param_name.startswith('@'):
+        param_name = compile__translate_known_label_to_mem_offset(param_name, parser, compile_context.labels_dict,
+                                                                  compile_context.label_fixups, output.size,
+                                                                  token_name)
+        output.write(param_name)
+    else:
+        output.write(solid_hex_string__to__bytes(param_name))
+    return param_name
+
+
+def compile__encode_null_terminated_string(param_name, output, parser, compile_context, token_name):
+    if '\"' == param_name[0]:
+        output.write(compile__unescape_text_token(param_name).encode())
+    else:
+        output.write(solid_hex_string__to__bytes(param_name))
+    output.write(b'\x00')
+    return param_name
+
+
+def compile__encode_hex(param_name, output, parser, compile_context, token_name):
+    output.write(solid_hex_string__to__bytes(param_name))
+    return param_name
+
+
+def compile__make_number_encoder(value_struct, value_type):
+    '''
+    :param value_struct: struct.Struct() of the quoted (decimal) value
+    :param value_type: int or float
+    '''
+    def compile__encode_number(param_name, output, parser, compile_context, token_name):
+        if '\"' == param_name[0]:
+            output.pack(value_struct, value_type(compile__unescape_text_token(param_name)))
+        else:
+            output.write(solid_hex_string__to__bytes(param_name))
+        return param_name
+    return compile__encode_number
+
+
+# param type name: encoder. Fixed size types which are not listed here are compiled from the hex.
+COMPILE_PARAM_ENCODER_BY_TYPE_NAME = {
+    'NameRef': compile__encode_name_ref,
+    'ObjRef': compile__encode_obj_ref,
+    'ObjRef_class': compile__encode_obj_ref,
+    'ObjRef_member': compile__encode_obj_ref,
+    'ObjRef_struct': compile__encode_obj_ref,
+    'RetValRef': compile__encode_obj_ref,
+    'MemOff': compile__encode_mem_off,
+    'NullTerminatedString': compile__encode_null_terminated_string,
+    'Byte': compile__make_number_encoder(COMPILE_NUMBER_STRUCT_BY_TYPE_NAME['Byte'], int),
+    'Short': compile__make_number_encoder(COMPILE_NUMBER_STRUCT_BY_TYPE_NAME['Short'], int),
+    'Int32': compile__make_number_encoder(COMPILE_NUMBER_STRUCT_BY_TYPE_NAME['Int32'], int),
+    'Float32': compile__make_number_encoder(COMPILE_NUMBER_STRUCT_BY_TYPE_NAME['Float32'], float),
+}
+
+
+def compile__build_encode_plan(token_info, token_types):
+    '''
+    :return: tuple() with an item for each token's param: (param_type_id, param_type, param_type_name, encoder,
+        memory_size). encoder is None for the params which are not TOKENTYPE_TYPE__JUST_SIZE; memory_size is None
+        when it is the same as the size of the encoded param (trailing zero of the null terminated param included)
+    '''
+    plan = list()
+    for param_type_id in token_info.params:
+        type_info = token_types.type_info_by_number[param_type_id]
+        encoder = None
+        memory_size = None
+        if token_types.TOKENTYPE_TYPE__JUST_SIZE == type_info.type:
+            encoder = COMPILE_PARAM_ENCODER_BY_TYPE_NAME.get(type_info.name, compile__encode_hex)
+            if type_info.mem_size_type != token_types.TOKENTYPE_MEMORY_SIZE_TYPE__SAME_AS_HEX_SIZE:
+                memory_size = type_info.mem_size_type
+                if token_types.TOKENTYPE_SIZE_TYPE__NULLTERMINATED == type_info.size_type:
+                    memory_size += 1
+        plan.append((param_type_id, type_info.type, type_info.name, encoder, memory_size))
+    return tuple(plan)
+
+
+def compile__build_size_plan(token_info, token_types):
+    '''
+    :return: tuple() with an item for each token's param: (param_type, param_type_name, hex_size, memory_size).
+        hex_size is None for the null terminated params (it depends on the param's text); memory_size is None when it
+        is the same as the hex size
+    '''
+    plan = list()
+    for param_type_id, param_type, param_type_name, encoder, memory_size in token_info.encode_plan:
+        hex_size = None
+        if token_types.TOKENTYPE_TYPE__JUST_SIZE == param_type:
+            size_type = token_types.type_info_by_number[param_type_id].size_type
+            if size_type > 0:
+                hex_size = size_type
+                if memory_size is None:
+                    memory_size = hex_size
+        plan.append((param_type, param_type_name, hex_size, memory_size))
+    return tuple(plan)
+
+for token in US_CODE_TABLE__ALL_TOKENS.tokens:
+    token.encode_plan = compile__build_encode_plan(token, TOKEN_TYPES)
+    token.size_plan = compile__build_size_plan(token, TOKEN_TYPES)
+
+
+class CompileFrame:
+    '''
+    State of the token which params are being compiled by the compile_token().
+    '''
+    __slots__ = ('token_info', 'token_termination_name', 'param_index', 'in_params_list', 'params_list_is_finished')
+
+    def __init__(self, token_info, token_termination_name):
+        self.token_info = token_info
+        self.token_termination_name = token_termination_name
+        self.param_index = 0
+        self.in_params_list = False
+        self.params_list_is_finished = False
+
+
+def compile_token(parser, compile_context, output, memory_offset):
+    '''
+    Compiles single token (with all it's params) starting from the parser's position. Nested expressions are compiled
+    with an explicit stack of CompileFrame() instead of recursion. Plain control flow: exceptions are propagated to the
+    full_compile(), where the error context is built.
+    :param parser: CompileParser(); it's position is moved past the compiled token
+    :param compile_context: CompileContext(); forward jumps are registered in it's label_fixups (see
+        compile__apply_label_fixups())
+    :param output: CompileOutput(); bytecode is appended to it. It's size is the current hex offset
+    :return: (current_token_list, number_of_found_tokens, memory_offset)
+    '''
     number_of_found_tokens = 0
+    labels_dict = compile_context.labels_dict
 
-    working_token_list = copy.copy(token_list)
-    current_token_list = copy.copy(found_tokens_list)
-    current_bytecode_list = list()
-    token_info = None
-    token_bytecode = None
-    token_name = None
-    token_params = None
-    token_termination_bytecode = None
-    token_termination = None
-    token_termination_name = None
-
-    with is_ok(context, 'find token id'):
-        if context:
+    current_token_list = list()
+
+    stack = list()
+    need_new_token = True
+    while True:
+        if need_new_token:
+            need_new_token = False
             try:
-                working_token_list = compile__detect_and_init_new_label(working_token_list, labels_dict, memory_offset)
-                token_name = working_token_list[0]
-                if 'JumpIfNot' == token_name:
-                    yyy = 8
+                compile__detect_and_init_new_label(parser, labels_dict, memory_offset)
+                token_name = parser.peek()
             except IndexError as err:
                 raise CantFindNextToken(str(err))
 
@@ -1342,255 +2382,131 @@ def compile_token(token_list, found_tokens_list, labels_dict, memory_offset, hex
 
             token_bytecode = token_info.code
             token_bytecode_len = len(token_bytecode)
-            token_params = token_info.params
             token_termination_bytecode = token_info.termination
-            token_termination = None
             token_termination_name = None
             if token_termination_bytecode is not None:
-                token_termination = US_CODE_TABLE__ALL_TOKENS.token_by_code[token_termination_bytecode]
-                token_termination_name = token_termination[1]
+                token_termination_name = US_CODE_TABLE__ALL_TOKENS.token_by_code[token_termination_bytecode][1]
 
-            current_bytecode_list.append(token_bytecode)
+            output.write(token_bytecode)
             current_token_list.append(token_name)
-            working_token_list = working_token_list[1:]
+            parser.position += 1
             memory_offset += token_bytecode_len
-            hex_offset += token_bytecode_len
+            stack.append(CompileFrame(token_info, token_termination_name))
 
-            context.push_result(True)
+        if not stack:
+            break
 
-    with is_ok(context, 'process token parameters'):
-        if context:
-            for param_t_id in token_params:
-                param_t_info = TOKEN_TYPES.type_info_by_number[param_t_id]
-                param_t_type = param_t_info.type
-                param_t_name = param_t_info.name
-                param_t_size_type = param_t_info.size_type
-                param_t_mem_size_type = param_t_info.mem_size_type
-
-                param_name = None
-                param_hex_code = None
-                param_bytecode = b''
-
-                if param_t_type is None:
-                    raise Exception('TOKEN COMPILATION: PARAM ID ({}) has unknown PARAM TYPE'.format(param_t_id))
-
-                if TOKEN_TYPES.TOKENTYPE_TYPE__HAS_TYPE == param_t_type:
-                    compile_result = compile_token(working_token_list, list(), labels_dict, memory_offset, hex_offset,
-                                                   first_pass)
-                    current_bytecode_list += compile_result[0]
-                    current_token_list += compile_result[2]
-                    working_token_list = compile_result[1]
-                    number_of_found_tokens += compile_result[3]
-                    memory_offset = compile_result[4]
-                    hex_offset = compile_result[5]
-                elif TOKEN_TYPES.TOKENTYPE_TYPE__TOKENS_LIST_WITH_TYPES == param_t_type:
-                    if token_termination is None:
-                        raise Exception('TOKEN COMPILATION: TOKEN ({}) has no termination'.format(token_name))
-                    param_name = working_token_list[0]
-                    # working_token_list = working_token_list[1:]
-                    continue_processing = True
-                    while continue_processing:
-                        if param_name == token_termination_name:
-                            continue_processing = False
-                        compile_result = compile_token(working_token_list, list(), labels_dict, memory_offset,
-                                                       hex_offset, first_pass)
-                        current_bytecode_list += compile_result[0]
-                        current_token_list += compile_result[2]
-                        working_token_list = compile_result[1]
-                        number_of_found_tokens += compile_result[3]
-                        memory_offset = compile_result[4]
-                        hex_offset = compile_result[5]
-                        if len(working_token_list) > 0:
-                            param_name = working_token_list[0]
-                        else:
-                            param_name = None
-                elif TOKEN_TYPES.TOKENTYPE_TYPE__JUST_SIZE == param_t_type:
-                    param_name = working_token_list[0]
-                    # print(param_name)
-                    working_token_list = working_token_list[1:]
-
-                    try:
-                        if param_t_name in {'NameRef'}:
-                            param_bytecode = compile__resolve_name_ref(param_name, UPK__NAMES_TABLE__ID_BY_NAME, True)
-                        elif param_t_name in {'ObjRef', 'ObjRef_class', 'ObjRef_member', 'ObjRef_struct', 'RetValRef'}:
-                            param_bytecode = compile__resolve_name_ref(param_name, UPK__NAMES__ID_BY_NAME, False)
-                        elif param_t_name in {'MemOff'}:
-                            if param_name.startswith('@'):
-                                if working_token_list[0] == '5':
-                                    yyy = 6
-                                working_token_list = compile__translate_known_label_to_mem_offset(param_name,
-                                                                                                  working_token_list,
-                                                                                                  labels_dict,
-                                                                                                  first_pass)
-                                param_name = working_token_list[0]
-                                working_token_list = working_token_list[1:]
-                                param_bytecode = param_name
-                            else:
-                                param_bytecode = solid_hex_string__to__bytes(param_name)
-                        elif param_t_name in {'NullTerminatedString'}:
-                            if '\"' == param_name[0]:
-                                cleam_param_name = compile__get_text_token(param_name)[1]
-                                param_bytecode = cleam_param_name.encode()
-                            else:
-                                param_bytecode = solid_hex_string__to__bytes(param_name)
-                        elif param_t_name in {'Byte'}:
-                            if '\"' == param_name[0]:
-                                clean_param_number = compile__get_text_token(param_name)[1]
-                                param_bytecode = byte_to_bytes(int(clean_param_number))
-                            else:
-                                param_bytecode = solid_hex_string__to__bytes(param_name)
-                        elif param_t_name in {'Short'}:
-                            if '\"' == param_name[0]:
-                                clean_param_number = compile__get_text_token(param_name)[1]
-                                param_bytecode = short_to_bytes(int(clean_param_number))
-                            else:
-                                param_bytecode = solid_hex_string__to__bytes(param_name)
-                        elif param_t_name in {'Int32'}:
-                            if '\"' == param_name[0]:
-                                clean_param_number = compile__get_text_token(param_name)[1]
-                                param_bytecode = int_to_bytes(int(clean_param_number))
-                            else:
-                                param_bytecode = solid_hex_string__to__bytes(param_name)
-                        elif param_t_name in {'Float32'}:
-                            if '\"' == param_name[0]:
-                                clean_param_number = compile__get_text_token(param_name)[1]
-                                param_bytecode = float_to_bytes(float(clean_param_number))
-                            else:
-                                param_bytecode = solid_hex_string__to__bytes(param_name)
-                        else:
-                            param_bytecode = solid_hex_string__to__bytes(param_name)
-                    except UnresolvableNameReference as ex:
-                        raise UnresolvableNameReference('PARAM ({}) OF TOKEN ({}) '
-                                                        'has unresolvable name reference ({})'.format(param_t_name,
-                                                                                                      token_name,
-                                                                                                      param_name),
-                                                        ex.name_ref)
-                    except struct.error as ex:
-                        raise CompileValueError(str(ex), token_name, param_name)
-                    except ValueError as ex:
-                        raise CompileValueError(str(ex), token_name, param_name)
-
-                    current_bytecode_list.append(param_bytecode)
-                    try:
-                        param_bytecode_len = len(param_bytecode)
-                    except:
-                        pass
-                    if param_t_mem_size_type == TOKEN_TYPES.TOKENTYPE_MEMORY_SIZE_TYPE__SAME_AS_HEX_SIZE:
-                        memory_offset += param_bytecode_len
-                    else:
-                        memory_offset += param_t_mem_size_type
-                    hex_offset += param_bytecode_len
-                    if TOKEN_TYPES.TOKENTYPE_SIZE_TYPE__NULLTERMINATED == param_t_size_type:
-                        current_bytecode_list.append(b'\x00')
-                        memory_offset += 1
-                        hex_offset += 1
-                    current_token_list.append(param_name)
-                    number_of_found_tokens += 1
+        frame = stack[-1]
+        token_info = frame.token_info
+        token_name = token_info.name
+
+        if frame.in_params_list:
+            if frame.params_list_is_finished:
+                frame.in_params_list = False
+            else:
+                if parser.is_finished():
+                    param_name = None
                 else:
-                    raise Exception('TOKEN COMPILATION: PARAM ID ({}) has unknown PARAM TYPE'.format(param_t_id))
+                    param_name = parser.peek()
+                if param_name == frame.token_termination_name:
+                    frame.params_list_is_finished = True
+                need_new_token = True
+                continue
 
-            context.push_result(True)
+        token_params = token_info.params
+        if frame.param_index >= len(token_params):
+            stack.pop()
+            continue
+
+        param_t_id, param_t_type, param_t_name, param_encoder, param_memory_size = \
+            token_info.encode_plan[frame.param_index]
+        frame.param_index += 1
+
+        param_name = None
+
+        if param_t_type is None:
+            raise Exception('TOKEN COMPILATION: PARAM ID ({}) has unknown PARAM TYPE'.format(param_t_id))
+
+        if TOKEN_TYPES.TOKENTYPE_TYPE__HAS_TYPE == param_t_type:
+            need_new_token = True
+        elif TOKEN_TYPES.TOKENTYPE_TYPE__TOKENS_LIST_WITH_TYPES == param_t_type:
+            if frame.token_termination_name is None:
+                raise Exception('TOKEN COMPILATION: TOKEN ({}) has no termination'.format(token_name))
+            frame.in_params_list = True
+            frame.params_list_is_finished = False
+        elif TOKEN_TYPES.TOKENTYPE_TYPE__JUST_SIZE == param_t_type:
+            param_name = parser.take()
+            param_hex_offset = output.size
 
-    with is_ok_reader(context):
-        if context:
-            result = (current_bytecode_list,
-                      working_token_list,
-                      current_token_list,
-                      number_of_found_tokens,
-                      memory_offset,
-                      hex_offset)
+            try:
+                param_name = param_encoder(param_name, output, parser, compile_context, token_name)
+            except UnresolvableNameReference as ex:
+                raise UnresolvableNameReference('PARAM ({}) OF TOKEN ({}) '
+                                                'has unresolvable name reference ({})'.format(param_t_name,
+                                                                                              token_name,
+                                                                                              param_name),
+                                                ex.name_ref)
+            except struct.error as ex:
+                raise CompileValueError(str(ex), token_name, param_name)
+            except ValueError as ex:
+                raise CompileValueError(str(ex), token_name, param_name)
+
+            if param_memory_size is None:
+                memory_offset += output.size - param_hex_offset
+            else:
+                memory_offset += param_memory_size
+            current_token_list.append(param_name)
+            number_of_found_tokens += 1
         else:
-            context.raise_bad_blocks()
+            raise Exception('TOKEN COMPILATION: PARAM ID ({}) has unknown PARAM TYPE'.format(param_t_id))
 
+    result = (current_token_list,
+              number_of_found_tokens,
+              memory_offset)
     return result
 
 
-def full_compile(original_input_data, labels_dict=None, first_pass=True):
-    input_data = copy.deepcopy(original_input_data)
+def full_compile(input_data, labels_dict=None, source_tokens=None, package_context=None):
+    '''
+    Single pass compilation: forward jumps are patched after the whole function is emitted.
+    :param input_data: source code str()
+    :param source_tokens: None or result of the compile__get_tokens(input_data) (if it was already lexed)
+    :param package_context: UpkPackageContext() of the target package; None - UPK_PACKAGE_CONTEXT
+    :return: (bytecode, number_of_found_tokens, memory_offset, hex_offset)
+    '''
     result = None
-    labels_dict = labels_dict or dict()
+    compile_context = CompileContext(package_context, labels_dict)
 
     context = IsOK_ContextHolder('UE3 Bytecode Compiler', None, ResultType(CriteriaType.optional, set()), False, True)
 
-    with is_ok(context, 'remove description from the code'):
-        if context:
-            description_end_word_len = len(DESCRIPTION_END_WORD)
-            while (DESCRIPTION_BEGIN_WORD in input_data) and (DESCRIPTION_END_WORD in input_data):
-                description_begin = input_data.index(DESCRIPTION_BEGIN_WORD)
-                description_end = input_data.index(DESCRIPTION_END_WORD)
-                if description_end > description_begin:
-                    input_data = input_data[:description_begin] + input_data[description_end + description_end_word_len:]
-                else:
-                    # print('ERROR: DESCRIPTION TAGS')
-                    raise IsOK_BlockFailed('ERROR: DESCRIPTION TAGS')
-            context.push_result(True, input_data)
-
-    with is_ok(context, 'get all text tokens'):
-        if context:
-            input_data = context.read_block_result_link('remove description from the code').result
-            input_data, text_tokens = compile__get_all_text_tokens(input_data)
-            # try:
-            #     input_data, text_tokens = compile__get_all_text_tokens(input_data)
-            # except CompileQuotesExceptionMissedRQuote as ex:
-            #     err_message = str(ex)
-            #     raise IsOK_BlockFailed(err_message)
-            context.push_result(True, (input_data, text_tokens))
-
     with is_ok(context, 'split to tokens list'):
         if context:
-            input_data, text_tokens = context.read_block_result_link('get all text tokens').result
-            input_data = ''.join(input_data.split())
-            input_data = ' '.join(input_data.split(','))
-            input_data = ' '.join(input_data.split('('))
-            input_data = ' '.join(input_data.split(')'))
-
-            # if ',' in input_data:
-            #     input_data = input_data.replace(',', ' ')
-            # if '(' in input_data:
-            #     input_data = input_data.replace('(', ' ')
-            # if ')' in input_data:
-            #     input_data = input_data.replace(')', ' ')
-
-            # set_of_delimiters = SET_OF_DELIMITERS
-            # for delimiter in set_of_delimiters:
-            #     if delimiter in input_data:
-            #         input_data = input_data.replace(delimiter, ' ')
-
-            tokens_list = input_data.split()
-
-            new_token_list = list()
-            for token in tokens_list:
-                if token[0] == '<':
-                    token = text_tokens[token]
-                new_token_list.append(token)
-            tokens_list = new_token_list
-            context.push_result(True, tokens_list)
+            if source_tokens is None:
+                source_tokens = compile__get_tokens(input_data)
+            context.push_result(True, source_tokens)
 
-    current_token_list = list()
-    found_tokens_list = list()
-    working_token_list = list()
+    tokens_list = list()
+    tokens_positions = list()
+    parser = CompileParser(tokens_list)
+    statement_position = 0
 
     with is_ok(context, 'tokens to bytecode'):
         if context:
-            tokens_list = context.read_block_result_link('split to tokens list').result
+            tokens_list, tokens_positions = context.read_block_result_link('split to tokens list').result
             # print(tokens_list)
-            current_token_list = list()
             found_tokens_list = list()
-            working_token_list = tokens_list
+            parser = CompileParser(tokens_list)
+            output = CompileOutput()
             number_of_found_tokens = 0
             memory_offset = 0
-            hex_offset = 0
-            while len(working_token_list) > 0:
-                compile_result = compile_token(working_token_list, list(), labels_dict, memory_offset, hex_offset,
-                                               first_pass)
-                current_token_list += compile_result[0]
-                working_token_list = compile_result[1]
-                found_tokens_list += compile_result[2]
-                number_of_found_tokens += compile_result[3]
-                memory_offset = compile_result[4]
-                hex_offset = compile_result[5]
-            compiled_bytecode = b''.join(current_token_list)
-            context.push_result(True, (compiled_bytecode, number_of_found_tokens, memory_offset, hex_offset))
+            while not parser.is_finished():
+                statement_position = parser.position
+                compile_result = compile_token(parser, compile_context, output, memory_offset)
+                found_tokens_list += compile_result[0]
+                number_of_found_tokens += compile_result[1]
+                memory_offset = compile_result[2]
+            compile__apply_label_fixups(output, compile_context.label_fixups, compile_context.labels_dict)
+            context.push_result(True, (output.get_bytes(), number_of_found_tokens, memory_offset, output.size))
 
     with is_ok_reader(context):
         if context:
@@ -1605,21 +2521,257 @@ def full_compile(original_input_data, labels_dict=None, first_pass=True):
                         ex = block_result_data.data
                         trace = block_result_data.str_data
                         if ex[0] in COMPILATION_EXCEPTIONS_SET:
+                            working_token_list = parser.get_remaining_tokens(statement_position)
+                            source_position = None
+                            error_source_position = None
+                            if CompileQuotesExceptionMissedRQuote == ex[0]:
+                                source_position = ex[1].l_bracket_position
+                                error_source_position = source_position
+                            elif statement_position < len(tokens_positions):
+                                source_position = tokens_positions[statement_position]
+                                # parser is not moved after the error
+                                error_source_position = tokens_positions[min(parser.position,
+                                                                             len(tokens_positions) - 1)]
                             # print()
                             # print(trace)
                             # print(ex[0])
                             # print(ex[1])
                             # print(working_token_list)
-                            raise CompileException(ex[0], ex[1], (working_token_list,), trace)
+                            raise CompileException(ex[0], ex[1], (working_token_list,), trace, source_position,
+                                                   error_source_position)
             # raise Exception(context.get_bad_blocks_str())
             context.raise_bad_blocks()
 
-    if first_pass:
-        result = full_compile(original_input_data, labels_dict, first_pass=False)
+    return result
+
+
+def compile__get_null_terminated_param_size(param_name):
+    '''
+    :return: hex size of the NullTerminatedString param (with the trailing zero)
+    '''
+    if '\"' == param_name[0]:
+        return len(compile__unescape_text_token(param_name).encode()) + 1
+    return len(param_name) // 2 + 1
+
+
+def compile_size(input_data, source_tokens=None):
+    '''
+    Size-only compilation: computes sizes of the function from the per-type size_type/mem_size_type data (see
+    compile__build_size_plan()) without producing the bytecode. Names are not resolved and numbers are not parsed,
+    so it expects the source which is compilable by the full_compile(); for such a source the result is the same as
+    full_compile()[1:].
+    Raises the same UnknownToken and CantFindNextToken as the compile_token() (without the error context).
+    :param source_tokens: None or result of the compile__get_tokens(input_data) (if it was already lexed)
+    :return: (number_of_found_tokens, memory_size, hex_size)
+    '''
+    if source_tokens is None:
+        source_tokens = compile__get_tokens(input_data)
+    parser = CompileParser(source_tokens[0])
+    tokens = parser.tokens
+    token_by_name = US_CODE_TABLE__ALL_TOKENS.token_by_name
+    labels_dict = dict()
+
+    number_of_found_tokens = 0
+    memory_size = 0
+    hex_size = 0
+    stack = list()
+    need_new_token = True
+    while True:
+        if need_new_token:
+            need_new_token = False
+            if not stack and parser.is_finished():
+                break
+            try:
+                compile__detect_and_init_new_label(parser, labels_dict, memory_size)
+                token_name = parser.peek()
+            except IndexError as err:
+                raise CantFindNextToken(str(err))
+
+            try:
+                token_info = token_by_name[token_name]
+            except KeyError as err:
+                raise UnknownToken(str(err), token_name)
+
+            token_termination_name = None
+            if token_info.termination is not None:
+                token_termination_name = US_CODE_TABLE__ALL_TOKENS.token_by_code[token_info.termination][1]
+
+            token_size = len(token_info.code)
+            parser.position += 1
+            memory_size += token_size
+            hex_size += token_size
+            stack.append(CompileFrame(token_info, token_termination_name))
+
+        if not stack:
+            need_new_token = True
+            continue
+
+        frame = stack[-1]
+        token_info = frame.token_info
+
+        if frame.in_params_list:
+            if frame.params_list_is_finished:
+                frame.in_params_list = False
+            else:
+                if parser.is_finished():
+                    param_name = None
+                else:
+                    param_name = tokens[parser.position]
+                if param_name == frame.token_termination_name:
+                    frame.params_list_is_finished = True
+                need_new_token = True
+                continue
+
+        size_plan = token_info.size_plan
+        if frame.param_index >= len(size_plan):
+            stack.pop()
+            if not stack:
+                need_new_token = True
+            continue
+
+        param_t_type, param_t_name, param_hex_size, param_memory_size = size_plan[frame.param_index]
+        frame.param_index += 1
+
+        if TOKEN_TYPES.TOKENTYPE_TYPE__HAS_TYPE == param_t_type:
+            need_new_token = True
+        elif TOKEN_TYPES.TOKENTYPE_TYPE__TOKENS_LIST_WITH_TYPES == param_t_type:
+            if frame.token_termination_name is None:
+                raise Exception('TOKEN COMPILATION: TOKEN ({}) has no termination'.format(token_info.name))
+            frame.in_params_list = True
+            frame.params_list_is_finished = False
+        elif TOKEN_TYPES.TOKENTYPE_TYPE__JUST_SIZE == param_t_type:
+            try:
+                param_name = parser.take()
+                if ('MemOff' == param_t_name) and param_name.startswith('@'):
+                    parser.take()  # label id (see compile__detect_known_label())
+            except IndexError as err:
+                raise CantFindNextToken(str(err))
+
+            if param_hex_size is None:
+                param_hex_size = compile__get_null_terminated_param_size(param_name)
+            hex_size += param_hex_size
+            if param_memory_size is None:
+                memory_size += param_hex_size
+            else:
+                memory_size += param_memory_size
+            number_of_found_tokens += 1
+        else:
+            raise Exception('TOKEN COMPILATION: PARAM TYPE ({}) is unknown'.format(param_t_type))
+
+    return number_of_found_tokens, memory_size, hex_size
+
+
+class DecompiledFunctionText:
+    '''
+    Already rendered DecompiledFunction() (as it is stored in the decompile cache). Has the same text interface, so it
+    can be written by the write_decompiled_ucb_file().
+    '''
+    def __init__(self, is_ok, text, text_only, number_of_found_tokens, memory_offset, hex_offset):
+        self.is_ok = is_ok
+        self.text = text
+        self.text_only = text_only
+        self.number_of_found_tokens = number_of_found_tokens
+        self.memory_offset = memory_offset
+        self.hex_offset = hex_offset
+
+    def iter_text(self):
+        yield self.text
+
+    def iter_text_only(self):
+        yield self.text_only
+
+    def render_text(self):
+        return self.text
+
+    def render_text_only(self):
+        return self.text_only
+
 
+def decompile__get_cache_key(input_data, package_context=None):
+    '''
+    Content address of the decompilation result: depends on the bytecode, on the names tables, on the token tables and
+    on the LANGUAGE_VERSION.
+    :param input_data: bytes()
+    :param package_context: UpkPackageContext(); None - UPK_PACKAGE_CONTEXT
+    :return: hex digest str()
+    '''
+    package_context = package_context or UPK_PACKAGE_CONTEXT
+    key = hashlib.sha1()
+    key.update('{}:{}:{}:'.format(package_context.tables.fingerprint, US_CODE_TABLE__FINGERPRINT,
+                                  LANGUAGE_VERSION).encode())
+    key.update(input_data)
+    return key.hexdigest()
+
+
+def cached_decompile_function(input_data, decompile_cache=None, d_print=None, package_context=None):
+    '''
+    decompile_function() through the content addressed cache.
+    :param decompile_cache: object with get(key) -> bytes() or None and put(key, bytes()) methods (like the
+        ucb_tools_files_cache_manager.ContentAddressedFileCache()); None - cache is not used
+    :param package_context: UpkPackageContext(); None - UPK_PACKAGE_CONTEXT
+    :return: DecompiledFunctionText()
+    '''
+    cache_key = None
+    if decompile_cache is not None:
+        cache_key = decompile__get_cache_key(input_data, package_context)
+        cached_data = decompile_cache.get(cache_key)
+        if cached_data is not None:
+            return DecompiledFunctionText(*pickle.loads(cached_data))
+
+    function = decompile_function(input_data, d_print, package_context=package_context)
+    result = DecompiledFunctionText(function.is_ok, function.render_text(), function.render_text_only(),
+                                    function.number_of_found_tokens, function.memory_offset, function.hex_offset)
+    if (decompile_cache is not None) and result.is_ok:
+        decompile_cache.put(cache_key, pickle.dumps((result.is_ok, result.text, result.text_only,
+                                                     result.number_of_found_tokens, result.memory_offset,
+                                                     result.hex_offset), pickle.HIGHEST_PROTOCOL))
     return result
 
 
+def compile__get_cache_key(tokens_list, package_context=None):
+    '''
+    Content address of the compilation result. Source is normalised by the lexer: whitespace, delimiters and the
+    description block do not change the key. Also depends on the names tables, on the token tables and on the
+    LANGUAGE_VERSION.
+    :param tokens_list: tokens_list of the compile__get_tokens()
+    :param package_context: UpkPackageContext(); None - UPK_PACKAGE_CONTEXT
+    :return: hex digest str()
+    '''
+    package_context = package_context or UPK_PACKAGE_CONTEXT
+    key = hashlib.sha1()
+    key.update('{}:{}:{}:'.format(package_context.tables.fingerprint, US_CODE_TABLE__FINGERPRINT,
+                                  LANGUAGE_VERSION).encode())
+    key.update(pickle.dumps(tokens_list, pickle.HIGHEST_PROTOCOL))
+    return key.hexdigest()
+
+
+def cached_full_compile(input_data, compile_cache=None, package_context=None):
+    '''
+    full_compile() through the content addressed cache (see cached_decompile_function()).
+    :param compile_cache: object with get(key) -> bytes() or None and put(key, bytes()) methods; None - cache is not
+        used
+    :param package_context: UpkPackageContext(); None - UPK_PACKAGE_CONTEXT
+    :return: ((bytecode, number_of_found_tokens, memory_offset, hex_offset), is_taken_from_cache)
+    '''
+    if compile_cache is None:
+        return full_compile(input_data, package_context=package_context), False
+
+    try:
+        source_tokens = compile__get_tokens(input_data)
+    except (CompileQuotesExceptionMissedRQuote, IsOK_BlockFailed):
+        # full_compile() will raise the same error with it's context
+        return full_compile(input_data, package_context=package_context), False
+
+    cache_key = compile__get_cache_key(source_tokens[0], package_context)
+    cached_data = compile_cache.get(cache_key)
+    if cached_data is not None:
+        return pickle.loads(cached_data), True
+
+    result = full_compile(input_data, source_tokens=source_tokens, package_context=package_context)
+    compile_cache.put(cache_key, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+    return result, False
+
+
 def decompile_and_then_compile_for_test_bytecode():
     some_wrong_prefix_data = ''
     # some_wrong_prefix_data = 'ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff ff'
@@ -1636,27 +2788,25 @@ def decompile_and_then_compile_for_test_bytecode():
 
     startTime = time.time()
     d_print = DebugPrinter(None, False, print_type=DebugPrintType.string)
-    decompile_result = full_decompile(input_string, d_print)
+    decompiled_function = decompile_function(input_string, d_print)
     print(d_print.full_string_log)
     endTime = time.time()
     resultTime = endTime - startTime
 
     print()
-    print('DECOMPILATION -- PROCESSED {} TOKENS IN {} SECONDS.'.format(decompile_result[3], resultTime))
-    if decompile_result[0]:
+    print('DECOMPILATION -- PROCESSED {} TOKENS IN {} SECONDS.'.format(decompiled_function.number_of_found_tokens,
+                                                                       resultTime))
+    if decompiled_function.is_ok:
         print('SUCCESS')
-        # print('FULL RESULT: {}'.format(decompile_result[1]))
-        # print('TEXT RESULT: {}'.format(decompile_result[2]))
         pass
     else:
-        print('FULL RESULT ERROR: {}'.format(decompile_result[1]))
-        print('TEXT RESULT ERROR: {}'.format(decompile_result[2]))
+        print('FULL RESULT ERROR: {}'.format(decompiled_function.render_text()))
+        print('TEXT RESULT ERROR: {}'.format(decompiled_function.render_text_only()))
 
-    for_file = DESCRIPTION_BEGIN_WORD + '\r\n' + '\r\n{}'.format(decompile_result[1]) + DESCRIPTION_END_WORD + '\r\n' \
-               + '\r\n\r\n{}'.format(decompile_result[2])
-    for_file = for_file.encode()
-    with open(OUTPUT_FILE_NAME, 'bw') as file:
-        file.write(for_file)
+    write_decompiled_ucb_file(OUTPUT_FILE_NAME, decompiled_function)
+
+    with open(OUTPUT_FILE_NAME, 'br') as file:
+        for_file = file.read()
 
     print()
     print('COMPILER TEST:')
@@ -1683,28 +2833,28 @@ def decompile_and_then_compile_for_test_bytecode():
 
     if not test_result:
         d_print = DebugPrinter(None, False, print_type=DebugPrintType.string)
-        decompile_result = full_decompile(compiled_bytecode, d_print)
+        decompiled_function = decompile_function(compiled_bytecode, d_print)
         print(d_print.full_string_log)
 
         print()
-        print('PROCESSED {} TOKENS.'.format(decompile_result[3]))
-        if decompile_result[0]:
+        print('PROCESSED {} TOKENS.'.format(decompiled_function.number_of_found_tokens))
+        if decompiled_function.is_ok:
             print('SUCCESS')
         else:
-            print('FULL RESULT ERROR: {}'.format(decompile_result[1]))
-            print('TEXT RESULT ERROR: {}'.format(decompile_result[2]))
+            print('FULL RESULT ERROR: {}'.format(decompiled_function.render_text()))
+            print('TEXT RESULT ERROR: {}'.format(decompiled_function.render_text_only()))
 
-        for_file = DESCRIPTION_BEGIN_WORD + '\r\n' + '\r\n{}'.format(decompile_result[1]) + DESCRIPTION_END_WORD + '\r\n' \
-                   + '\r\n\r\n{}'.format(decompile_result[2])
-        for_file = for_file.encode()
-        with open(OUTPUT_FILE_NAME+'.debug.ucb', 'bw') as file:
-            file.write(for_file)
+        write_decompiled_ucb_file(OUTPUT_FILE_NAME+'.debug.ucb', decompiled_function)
 
     print()
     print('DONE.')
 
 
-def compile_and_reformat_source_code():
+def compile_and_reformat_source_code(compile_cache=None):
+    '''
+    :param compile_cache: cache of the cached_full_compile() (e.g. get_compiled_functions_cache() of the
+        ucb_tools_files_cache_manager); None - cache is not used
+    '''
     d_print = DebugPrinter(None, False, print_type=DebugPrintType.string)
     default_source_ucb_file_name = r'C:\Development\XCOM Modding\NewHitDamageCalc\XComGame.XGAbility_Targeted.' \
                                    r'RollForHit.new.ucb'
@@ -1721,7 +2871,7 @@ def compile_and_reformat_source_code():
     with open(''.join([ucb_file_name, '.', str(int(time.time())), '.bak']), 'w') as file:
         file.write(original_ucb_file_data)
 
-    compile_result = full_compile(original_ucb_file_data)
+    compile_result, is_taken_from_cache = cached_full_compile(original_ucb_file_data, compile_cache)
     compiled_bytecode = compile_result[0]
     compiled_hex_code = bytes__to__hex_string(compiled_bytecode)
 
@@ -1733,26 +2883,25 @@ def compile_and_reformat_source_code():
     print('PROCESSED {} TOKENS'.format(compile_result[1]))
     print('SUCCESS')
 
-    decompile_result = full_decompile(compiled_bytecode, d_print)
+    if is_taken_from_cache:
+        print('COMPILED CODE IS TAKEN FROM THE CACHE')
+
+    decompiled_function = decompile_function(compiled_bytecode, d_print)
     print(d_print.full_string_log)
     print()
     print('DECOMPILATION DONE')
-    print('PROCESSED {} TOKENS.'.format(decompile_result[3]))
-    if decompile_result[0]:
+    print('PROCESSED {} TOKENS.'.format(decompiled_function.number_of_found_tokens))
+    if decompiled_function.is_ok:
         print('SUCCESS')
     else:
-        print('FULL RESULT ERROR: {}'.format(decompile_result[1]))
-        print('TEXT RESULT ERROR: {}'.format(decompile_result[2]))
-
-    for_file = DESCRIPTION_BEGIN_WORD + '\r\n' + '\r\n{}'.format(decompile_result[1]) + DESCRIPTION_END_WORD + '\r\n' \
-               + '\r\n\r\n{}'.format(decompile_result[2])
-    for_file = for_file.encode()
-    with open(ucb_file_name + FileExtensions.reformatted_ucb_source_code, 'bw') as file:
-        file.write(for_file)
-
-    if decompile_result[0]:
-        print('Mem size', decompile_result[4])
-        print('HEX size', decompile_result[5])
+        print('FULL RESULT ERROR: {}'.format(decompiled_function.render_text()))
+        print('TEXT RESULT ERROR: {}'.format(decompiled_function.render_text_only()))
+
+    write_decompiled_ucb_file(ucb_file_name + FileExtensions.reformatted_ucb_source_code, decompiled_function)
+
+    if decompiled_function.is_ok:
+        print('Mem size', decompiled_function.memory_offset)
+        print('HEX size', decompiled_function.hex_offset)
         print('Bytes len', len(compiled_bytecode))
 
         mod_file_content_strings = [
@@ -1763,7 +2912,7 @@ def compile_and_reformat_source_code():
             'OBJECT=XGAbility_Targeted.RollForHit:AUTO',
             '[REPLACEMENT_CODE]',
             compiled_hex_code,
-            # 'EXPAND_FUNCTION=XGAbility_Targeted.RollForHit:' + str(decompile_result[4])
+            # 'EXPAND_FUNCTION=XGAbility_Targeted.RollForHit:' + str(decompiled_function.memory_offset)
         ]
 
         mod_file_content = '\n'.join(mod_file_content_strings)
@@ -1846,6 +2995,8 @@ if __name__ == "__main__":
         # decompile_and_then_compile_for_test_bytecode()
         # cProfile.run('decompile_and_then_compile_for_test_bytecode()', 'ue_bytecode_assembler.prof')
     elif 'c' == option:
-        run_compile_and_reformat_source_code_with_debug_out(compile_and_reformat_source_code)
+        from ucb_tools_files_cache_manager import get_compiled_functions_cache
+        run_compile_and_reformat_source_code_with_debug_out(
+                lambda: compile_and_reformat_source_code(get_compiled_functions_cache()))
     else:
         print('WRONG OPTION!')